@@ -1,17 +1,28 @@
 from rasa_sdk import Tracker, Action
 from rasa_sdk.executor import CollectingDispatcher
-from typing import Dict, Text, Any, List
+from typing import Dict, Text, Any, List, Callable, NamedTuple, Optional, Tuple
 from rasa_sdk.events import SlotSet, ReminderScheduled, AllSlotsReset
-from neo4j import GraphDatabase
+import asyncio
 import datetime
 import random
-from thefuzz import process  # Import the necessary module from thefuzz
 import re
 from actions import utils
-import yaml
+from actions import graph_backend
+from actions import exhibit_catalog
+from actions.exhibit_catalog import ExhibitFilters, ExhibitRow
+from actions import graph_cache
+from actions import cypher
+from actions import metrics
+from actions import carousels
+from actions import fallback_cache
+from actions import genai_config
+from actions import single_flight
+from actions.entity_resolver import EntityResolver
 import os
 from dotenv import load_dotenv, set_key
 
+load_dotenv()
+
 
 # def print_friends(tx, name):
 #     names = []
@@ -27,22 +38,26 @@ from dotenv import load_dotenv, set_key
 #     return record["friend.name"]
 
 
-def print_books_type(tx, book_type_pl):
+# How many random exhibits/books are shown to the visitor per answer
+SAMPLE_SIZE = 5
+
+# How many random candidates a cached graph query keeps to sample SAMPLE_SIZE from at serve time
+CANDIDATE_POOL_SIZE = int(os.getenv("GRAPH_CANDIDATE_POOL_SIZE", 50))
+
+
+async def print_books_type(tx, book_type_pl):
     books_names_list = []
+    count_book_type_list = 0
 
-    # Query without ORDER BY rand()
-    for record in tx.run(
-            "MATCH (a:WRITER)-[:WROTE]->(book) "
-            "WHERE a.name = 'Νίκος Καζαντζάκης' AND book.type_pl = $book_type_pl "
-            "RETURN book.name AS name", book_type_pl=book_type_pl):
+    # The count is computed on the server and only SAMPLE_SIZE random books are transferred
+    result = await tx.run(
+            cypher.BOOKS_BY_TYPE_QUERY, book_type_pl=book_type_pl, limit=SAMPLE_SIZE)
+    async for record in result:
+        count_book_type_list = record["total"]
         books_names_list.append(record["name"])
 
-    # Randomly select up to 5 books
-    random_books_list = random.sample(books_names_list, min(len(books_names_list), 5))
-
     # Return the count and the random selection
-    count_book_type_list = len(books_names_list)
-    return count_book_type_list, random_books_list
+    return count_book_type_list, books_names_list
 
 
 # def print_halls(tx, hall_name, exhibits_collection):
@@ -79,59 +94,42 @@ def print_books_type(tx, book_type_pl):
 #
 #     return exhibition_names_list, exhibition_url_list
 
-def print_halls(tx, hall_name, exhibits_collection):
+async def print_halls(tx, hall_name, exhibits_collection, limit=SAMPLE_SIZE):
     exhibition_names_list = []
     exhibition_url_list = []
 
-    # Query without ORDER BY rand()
+    # The random sample is taken by the server, so only `limit` records are transferred
     if exhibits_collection is not None:
-        query = (
-            "MATCH (exhibits:EXHIBIT) - [:ISLOCATEDIN] -> (hall:HALL) "
-            "WHERE hall.name = $hall_name AND exhibits.collection = $exhibits_collection "
-            "RETURN exhibits.name AS name, exhibits.url AS url"
-        )
+        query = cypher.HALL_COLLECTION_EXHIBITS_QUERY
         params = {"hall_name": hall_name, "exhibits_collection": exhibits_collection}
     else:
-        query = (
-            "MATCH (exhibits:EXHIBIT) - [:ISLOCATEDIN] -> (hall:HALL) "
-            "WHERE hall.name = $hall_name "
-            "RETURN exhibits.name AS name, exhibits.url AS url"
-        )
+        query = cypher.HALL_EXHIBITS_QUERY
         params = {"hall_name": hall_name}
 
-    records = list(tx.run(query, **params))
-    print("records list: ", records)
-
-    # Use Python's random.sample to select 5 random records
-    if records:
-        sampled_records = random.sample(records, min(len(records), 5))
-        for record in sampled_records:
-            exhibition_names_list.append(record["name"])
-            exhibition_url_list.append(record["url"])
+    result = await tx.run(query, limit=limit, **params)
+    async for record in result:
+        exhibition_names_list.append(record["name"])
+        exhibition_url_list.append(record["url"])
 
     return exhibition_names_list, exhibition_url_list
 
 
-def print_collection(tx, exhibits_collection):
+async def print_collection(tx, exhibits_collection, limit=SAMPLE_SIZE):
     exhibition_names_list = []
 
     # Check if exhibits_collection is provided
     if exhibits_collection is not None:
-        for record in tx.run(
-                "MATCH (exhibits:EXHIBIT) - [:ISLOCATEDIN] -> (hall:HALL) "
-                "WHERE exhibits.collection = $exhibits_collection "
-                "RETURN exhibits.name AS name",
-                exhibits_collection=exhibits_collection):
+        result = await tx.run(
+                cypher.COLLECTION_EXHIBITS_QUERY,
+                exhibits_collection=exhibits_collection, limit=limit)
+        async for record in result:
             exhibition_names_list.append(record["name"])
 
-    # Randomly select up to 5 exhibits
-    random_exhibits_list = random.sample(exhibition_names_list, min(len(exhibition_names_list), 5))
-
     # Return the random selection
-    return random_exhibits_list
+    return exhibition_names_list
 
 
-def print_collection_and_showcase(tx, exhibits_collection, exhibits_showcase):
+async def print_collection_and_showcase(tx, exhibits_collection, exhibits_showcase, limit=SAMPLE_SIZE):
     exhibition_names_list = []
     exhibition_url_list = []
 
@@ -139,46 +137,42 @@ def print_collection_and_showcase(tx, exhibits_collection, exhibits_showcase):
 
     # Check if both exhibits_collection and exhibits_showcase are provided
     if exhibits_collection is not None and exhibits_showcase is not None:
-        for record in tx.run(
-                "MATCH (exhibits:EXHIBIT) "
-                "WHERE exhibits.collection = $exhibits_collection AND exhibits.showcase = $exhibits_showcase "
-                "RETURN exhibits.name AS name, exhibits.url AS url",
-                exhibits_collection=exhibits_collection, exhibits_showcase=exhibits_showcase):
+        result = await tx.run(
+                cypher.COLLECTION_SHOWCASE_EXHIBITS_QUERY,
+                exhibits_collection=exhibits_collection, exhibits_showcase=exhibits_showcase, limit=limit)
+        async for record in result:
             exhibition_names_list.append(record["name"])
             exhibition_url_list.append(record["url"])
 
-    # Combine names and URLs into pairs and sample up to 5 random pairs
-    exhibit_pairs = list(zip(exhibition_names_list, exhibition_url_list))
-    random_exhibits = random.sample(exhibit_pairs, min(len(exhibit_pairs), 5))
-
-    # Unpack random pairs back into separate lists for names and URLs
-    random_exhibition_names, random_exhibition_urls = zip(*random_exhibits) if random_exhibits else ([], [])
-
-    return list(random_exhibition_names), list(random_exhibition_urls)
+    return exhibition_names_list, exhibition_url_list
 
 
-def print_floor(tx, floor):
+async def print_floor(tx, floor, limit=SAMPLE_SIZE):
     exhibition_names_list = []
     exhibition_url_list = []
 
     # Check if the floor parameter is provided
     if floor is not None:
-        for record in tx.run(
-                "MATCH (exhibits:EXHIBIT) - [:ISLOCATEDIN] -> (hall:HALL) "
-                "WHERE hall.floor = $floor "
-                "RETURN exhibits.name AS name, exhibits.url AS url",
-                floor=floor):
+        result = await tx.run(
+                cypher.FLOOR_EXHIBITS_QUERY,
+                floor=floor, limit=limit)
+        async for record in result:
             exhibition_names_list.append(record["name"])
             exhibition_url_list.append(record["url"])
 
-    # Combine names and URLs into pairs and sample up to 5 random pairs
-    exhibit_pairs = list(zip(exhibition_names_list, exhibition_url_list))
-    random_exhibits = random.sample(exhibit_pairs, min(len(exhibit_pairs), 5))
+    return exhibition_names_list, exhibition_url_list
 
-    # Unpack random pairs back into separate lists for names and URLs
-    random_exhibition_names, random_exhibition_urls = zip(*random_exhibits) if random_exhibits else ([], [])
 
-    return list(random_exhibition_names), list(random_exhibition_urls)
+async def print_filtered_exhibits(tx, filters, limit=SAMPLE_SIZE):
+    query, params = cypher.build_filtered_exhibits_query(filters)
+
+    exhibits = []
+    result = await tx.run(query, limit=limit, **params)
+    async for record in result:
+        exhibits.append(ExhibitRow(record["name"], record["url"], record["hall"],
+                                   record["collection"], record["showcase"], record["floor"]))
+
+    return exhibits
 
 
 # def print_complete_graph(tx, husband, has_wife, has_written):
@@ -196,18 +190,6 @@ def print_floor(tx, floor):
 # MERGE (a:Person{name: "Νίκος Καζαντζάκης"})-[has_written:HAS_WRITTEN{name: "έγραψε"}]->(book:Book{name: "Ο Καπετάν Μιχάλης"})
 # MERGE (a)-[has_wife:HAS_WIFE{name: "σύζυγο"}]->(friend:Person{name: "Ελένη Καζαντζάκη"})
 
-# Dictionary of known entities and their corresponding functions
-ENTITY_FUNCTION_MAPPING = {
-    'Νίκος Καζαντζάκης': 'print_friends',
-    'μυθιστορήματα': 'print_books_type',
-    'ποιήματα': 'print_books_type',
-    'ταξιδιωτικά': 'print_books_type',
-    'θεατρικά': 'print_books_type',
-    'TRAVELEDTO': 'print_location_countries',
-    'φίλος': 'print_friends_type',
-    'συγγενής': 'print_relatives_type',
-}
-
 # List of known book titles for fuzzy matching
 KNOWN_HALLS = [
     'Βιογραφικά',
@@ -235,45 +217,219 @@ KNOWN_FLOORS = [
     'Σκάλα'
 ]
 
+# Compiled once: exact normalised hits first, fuzzy matching only on a miss, memoised per slot value
+RESOLVER = EntityResolver({
+    'hall': KNOWN_HALLS,
+    'collection': KNOWN_COLLECTIONS,
+    'floor': KNOWN_FLOORS,
+})
 
-def get_relationship_2_variables(slot_based_query1, slot_based_query2):
-    function_to_call = None  # Initialize function_to_call
 
-    driver = GraphDatabase.driver(url,
-                                  auth=(username, password))  # Gia Docker connection
+# Load the exhibit catalog in the background so that the common questions are answered from memory
+exhibit_catalog.start_catalog()
 
-    # print("driver.verify_connectivity(): ", driver.verify_connectivity())
+# Per-action latency histograms on :METRICS_PORT/metrics (see actions/metrics.py)
+metrics.start_metrics_server()
+
+
+def sample_exhibits(exhibit_pairs, k=SAMPLE_SIZE):
+    """Pick up to k random (name, url) pairs and return them as two lists (O(k) on an in-memory tuple)."""
+    random_exhibits = random.sample(exhibit_pairs, min(len(exhibit_pairs), k))
+    random_exhibition_names, random_exhibition_urls = zip(*random_exhibits) if random_exhibits else ([], [])
+    return list(random_exhibition_names), list(random_exhibition_urls)
+
+
+def parse_showcase(value):
+    """Showcase numbers have 1 to 3 digits."""
+    return value if re.match(r'^\d{1,3}$', value) else None
+
+
+def parse_year(value):
+    """Publication years have 4 digits."""
+    return value if re.match(r'^\d{4}$', value) else None
 
-    def process_query(query):
-        query = str(query)
 
-        # Regex to match numbers with 1 to 3 digits
-        number_pattern = re.match(r'^\d{1,3}$', query)
+class QueryHandler(NamedTuple):
+    """How a slot value of one kind is parsed and which graph query answers it."""
+    parse: Optional[Callable[[Text], Optional[Text]]]  # raw slot value -> query parameter, or None if it
+                                                        # doesn't apply; None for the RESOLVER kinds
+    query: Optional[Callable] = None           # async transaction function, None while there is no query yet
+    catalog_lookup: Optional[Callable] = None  # ExhibitCatalog method answering the same query from memory
+    names_only: bool = False                   # the query returns exhibit names without urls
 
-        if number_pattern:
-            # If the query is a number (1 to 3 digits), return the corresponding function name
-            # print(f"Matched a number: {query}")
-            return query, 'print_collection_and_showcase'
+
+# Static dispatch table, slot kind -> handler. Built once at import and never mutated per request.
+QUERY_HANDLERS = {
+    'showcase': QueryHandler(parse_showcase, print_collection_and_showcase,
+                             exhibit_catalog.ExhibitCatalog.collection_showcase_exhibits),
+    'year': QueryHandler(parse_year),  # print_publicationyear has no query yet
+    # Known entity names, resolved by RESOLVER
+    'hall': QueryHandler(None, print_halls,
+                         exhibit_catalog.ExhibitCatalog.hall_exhibits),
+    'collection': QueryHandler(None, print_collection,
+                               exhibit_catalog.ExhibitCatalog.collection_exhibits, names_only=True),
+    'floor': QueryHandler(None, print_floor,
+                          exhibit_catalog.ExhibitCatalog.floor_exhibits),
+}
+
+
+def parse_slot(value, kinds):
+    """
+    Return (kind, parameter) for the slot value, else (None, None). The pattern kinds (showcase, year)
+    are tried first, in order; the entity kinds are then resolved in one RESOLVER call, so that an exact
+    synonym or lookup match of any of them wins over a fuzzy match of an earlier one.
+    """
+    value = str(value)
+    with metrics.phase("entity_resolution"):
+        entity_kinds = []
+        for kind in kinds:
+            parse = QUERY_HANDLERS[kind].parse
+            if parse is None:
+                entity_kinds.append(kind)
+                continue
+            parameter = parse(value)
+            if parameter is not None:
+                return kind, parameter
+        if entity_kinds:
+            return RESOLVER.resolve(value, entity_kinds)
+    return None, None
+
+
+async def query_exhibit_candidates(handler, key, *args):
+    """Query Neo4j for the handler's candidate (name, url) pairs and cache them under key."""
+    result = await graph_backend.get_backend().execute_read(handler.query, *args, limit=CANDIDATE_POOL_SIZE)
+
+    if handler.names_only:
+        candidates = tuple((name, None) for name in result)
+    else:
+        candidates = tuple(zip(*result))
+    graph_cache.GRAPH_CACHE.set(key, candidates)
+    return candidates
+
+
+async def read_exhibit_candidates(handler, *args):
+    """
+    Candidate (name, url) pairs from the graph result cache, querying Neo4j only on a miss.
+    Identical misses in flight at the same time share one query.
+    """
+    key = graph_cache.make_key(handler.query.__name__, *args)
+    candidates = graph_cache.GRAPH_CACHE.get(key)
+
+    if candidates is None:
+        candidates, shared = await single_flight.GRAPH_CALLS.do(key, query_exhibit_candidates, handler, key, *args)
+        metrics.GRAPH_LOOKUPS_TOTAL.inc("coalesced" if shared else "neo4j")
+    else:
+        metrics.GRAPH_LOOKUPS_TOTAL.inc("cache")
+
+    return candidates
+
+
+async def fetch_exhibits(handler, *args):
+    """
+    Run the handler's graph query: answer from the exhibit catalog, else from the result cache / Neo4j,
+    and sample SAMPLE_SIZE exhibits at serve time so every visitor gets a varied selection.
+    Returns the same shape as the handler's print_* function.
+    """
+    with metrics.phase("graph_query"):
+        candidates = handler.catalog_lookup(exhibit_catalog.CATALOG, *args)
+        if candidates is None:
+            candidates = await read_exhibit_candidates(handler, *args)
         else:
-            # print("query:", query)
-            # print("type query:", type(query))
-
-            # Fuzzy match against known halls and collections
-            halls_match, halls_score = process.extractOne(query, KNOWN_HALLS)
-            # print("halls_score:", halls_score)
-            # print("halls_match:", halls_match)
-
-            collection_match, collection_score = process.extractOne(query, KNOWN_COLLECTIONS)
-            # print("collection_score:", collection_score)
-            # print("collection_match:", collection_match)
-
-            if halls_score >= 60:
-                return halls_match, 'print_halls'
-            elif collection_score >= 60:
-                return collection_match, 'print_halls'  # Calling `print_halls` for collections
+            metrics.GRAPH_LOOKUPS_TOTAL.inc("catalog")
+
+    exhibition_names, exhibition_urls = sample_exhibits(candidates)
+    if handler.names_only:
+        return exhibition_names
+    return exhibition_names, exhibition_urls
+
+
+class ExhibitSelection(NamedTuple):
+    """Structured answer of a combined query: the filters it covered and the sampled exhibits."""
+    filters: ExhibitFilters
+    exhibits: Tuple[ExhibitRow, ...]
+
+    @property
+    def exhibition_names(self):
+        return [exhibit.name for exhibit in self.exhibits]
+
+    @property
+    def urls(self):
+        return [exhibit.url for exhibit in self.exhibits]
+
+
+# Entity types of a message that filter exhibits, and the kinds each value is resolved against
+FILTER_ENTITY_KINDS = {
+    'hall': ('hall', 'collection'),
+    'collection': ('collection', 'hall'),
+    'showcase': ('showcase',),
+    'floor': ('floor',),
+}
+
+
+def message_filters(entities):
+    """Resolve every hall / collection / showcase / floor entity of the latest message into ExhibitFilters."""
+    values = {'hall': [], 'collection': [], 'showcase': [], 'floor': []}
+
+    for entity in entities or []:
+        kinds = FILTER_ENTITY_KINDS.get(entity.get("entity"))
+        if kinds is None or entity.get("value") is None:
+            continue
+        kind, parameter = parse_slot(entity["value"], kinds)
+        if kind == 'showcase':
+            parameter = int(parameter)
+        if kind is not None and parameter not in values[kind]:
+            values[kind].append(parameter)
+
+    return ExhibitFilters(halls=tuple(values['hall']),
+                          collections=tuple(values['collection']),
+                          showcases=tuple(values['showcase']),
+                          floors=tuple(values['floor']))
+
+
+async def query_filtered_candidates(key, filters):
+    """Query Neo4j for the ExhibitRows matching every filter and cache them under key."""
+    candidates = tuple(await graph_backend.get_backend().execute_read(
+        print_filtered_exhibits, filters, limit=CANDIDATE_POOL_SIZE))
+    graph_cache.GRAPH_CACHE.set(key, candidates)
+    return candidates
+
+
+async def fetch_filtered_exhibits(filters):
+    """
+    Answer a compound question (several entities) in one go: from the exhibit catalog when it is loaded,
+    otherwise with a single Cypher round trip whose candidates are cached like the other graph queries.
+    """
+    with metrics.phase("graph_query"):
+        candidates = exhibit_catalog.CATALOG.find_exhibits(filters)
+
+        if candidates is None:
+            key = graph_cache.make_key(print_filtered_exhibits.__name__, *filters)
+            candidates = graph_cache.GRAPH_CACHE.get(key)
+            if candidates is None:
+                candidates, shared = await single_flight.GRAPH_CALLS.do(key, query_filtered_candidates, key, filters)
+                metrics.GRAPH_LOOKUPS_TOTAL.inc("coalesced" if shared else "neo4j")
             else:
-                print(f"Δεν βρέθηκε αντιστοίχιση για: {query}")
-                return None, None
+                metrics.GRAPH_LOOKUPS_TOTAL.inc("cache")
+        else:
+            metrics.GRAPH_LOOKUPS_TOTAL.inc("catalog")
+
+    return ExhibitSelection(filters, tuple(random.sample(candidates, min(len(candidates), SAMPLE_SIZE))))
+
+
+async def get_relationship_2_variables(slot_based_query1, slot_based_query2):
+    handler = None  # Initialize handler
+
+    def process_query(query):
+        # A number (1 to 3 digits) is a showcase, otherwise resolve against known halls first, then collections
+        kind, match = parse_slot(query, ('showcase', 'hall', 'collection'))
+
+        if kind == 'showcase':
+            return match, QUERY_HANDLERS['showcase']
+        elif kind is not None:
+            return match, QUERY_HANDLERS['hall']  # Calling `print_halls` for collections too
+        else:
+            print(f"Δεν βρέθηκε αντιστοίχιση για: {query}")
+            return None, None
 
     # Process slot_based_query1
     if isinstance(slot_based_query1, list):
@@ -282,7 +438,7 @@ def get_relationship_2_variables(slot_based_query1, slot_based_query2):
     else:
         print("The variable is not a list.")
 
-    match1, function1 = process_query(slot_based_query1)
+    match1, handler1 = process_query(slot_based_query1)
 
     # Process slot_based_query2
     if isinstance(slot_based_query2, list):
@@ -291,10 +447,10 @@ def get_relationship_2_variables(slot_based_query1, slot_based_query2):
     else:
         print("The variable is not a list.")
 
-    match2, function2 = process_query(slot_based_query2)
+    match2, handler2 = process_query(slot_based_query2)
 
-    # Determine final matches and functions
-    if function1 == 'print_halls':
+    # Determine final matches and handler
+    if handler1 is QUERY_HANDLERS['hall']:
         # final_match = match1 if match1 else match2
         # showcase_match = match2 if match1 is None and match2 is not None else None
         final_match = match1
@@ -305,64 +461,41 @@ def get_relationship_2_variables(slot_based_query1, slot_based_query2):
         final_match = match1 if match1 else match2
         showcase_match = None
 
-    function_to_call = function1 if function1 else function2
+    handler = handler1 if handler1 else handler2
 
     # print("final_match:", final_match)
     # print("showcase_match:", showcase_match)
-    # print("function_to_call:", function_to_call)
 
-    with driver.session() as session:
-        if function_to_call == 'print_collection_and_showcase':
-            query_exhibition_names, query_exhibition_url = session.read_transaction(
-                print_collection_and_showcase, final_match, showcase_match
-            )
-        elif function_to_call == 'print_halls':
-            query_exhibition_names, query_exhibition_url = session.read_transaction(
-                print_halls, final_match, showcase_match
-            )
-        driver.close()
-        return query_exhibition_names, query_exhibition_url
+    if handler is None:
+        return [], []
+
+    return await fetch_exhibits(handler, final_match, showcase_match)
 
 
 def check_collection_and_showcase(collection_match, showcase_match):
     """
     Check if both collection and showcase variables are not None and showcase is a valid 3-digit number.
     """
-    if collection_match and showcase_match and re.match(r'^\d{1,3}$', showcase_match):
+    if collection_match and showcase_match and parse_showcase(showcase_match):
         return True
     return False
 
 
 def process_query(query):
-    query = str(query)
-
-    # Regex to match numbers with 1 to 3 digits
-    number_pattern = re.match(r'^\d{1,3}$', query)
-
-    if number_pattern:
-        # If the query is a number (1 to 3 digits), assume it is a showcase variable
-        print(f"Matched a number: {query}")
-        return None, query  # No collection match, only showcase match
+    # A number (1 to 3 digits) is a showcase, otherwise resolve against known collections
+    kind, match = parse_slot(query, ('showcase', 'collection'))
+
+    if kind == 'showcase':
+        print(f"Matched a number: {match}")
+        return None, match  # No collection match, only showcase match
+    elif kind == 'collection':
+        return match, None  # No showcase match, only collection match
     else:
-        # print("query:", query)
-        # print("type query:", type(query))
+        print(f"Δεν βρέθηκε αντιστοίχιση για: {query}")
+        return None, None
 
-        # Fuzzy match against known collections
-        collection_match, collection_score = process.extractOne(query, KNOWN_COLLECTIONS)
-        # print("collection_score:", collection_score)
-        # print("collection_match:", collection_match)
-
-        if collection_score >= 60:
-            return collection_match, None  # No showcase match, only collection match
-        else:
-            print(f"Δεν βρέθηκε αντιστοίχιση για: {query}")
-            return None, None
-
-
-def get_relationship_collection_with_showcase(slot_based_query1, slot_based_query2):
-    driver = GraphDatabase.driver(url,
-                                  auth=("neo4j", password))  # Gia Docker connection
 
+async def get_relationship_collection_with_showcase(slot_based_query1, slot_based_query2):
     # Process slot_based_query1
     if isinstance(slot_based_query1, list):
         slot_based_query1 = slot_based_query1[0]
@@ -385,103 +518,36 @@ def get_relationship_collection_with_showcase(slot_based_query1, slot_based_quer
     final_collection_match = collection_match1 if collection_match1 else collection_match2
     final_showcase_match = showcase_match1 if showcase_match1 else showcase_match2
 
-    if check_collection_and_showcase(final_collection_match, final_showcase_match):
-        function_to_call = 'print_collection_and_showcase'
-    else:
-        function_to_call = None  # or handle the case where `function_to_call` is not set
-
     # print("final_collection_match:", final_collection_match)
     # print("final_showcase_match:", final_showcase_match)
-    # print("function_to_call:", function_to_call)
-
-    with driver.session() as session:
-        if function_to_call == 'print_collection_and_showcase':
-            query_exhibition_names, query_exhibition_url = session.read_transaction(
-                print_collection_and_showcase, final_collection_match, final_showcase_match
-            )
-            driver.close()
-            return query_exhibition_names, query_exhibition_url
-        else:
-            # Handle the case where no valid function is determined
-            driver.close()
-            return [], []  # Or another appropriate response
-
 
-def get_relationship_1_variable(slot_based_query):
-    function_to_call = None  # Initialize function_to_call
+    if check_collection_and_showcase(final_collection_match, final_showcase_match):
+        return await fetch_exhibits(QUERY_HANDLERS['showcase'], final_collection_match, final_showcase_match)
+    else:
+        # Handle the case where no valid query is determined
+        return [], []  # Or another appropriate response
 
-    driver = GraphDatabase.driver(url,
-                                  auth=("neo4j", password))  # Gia Docker connection
-    # print("driver.verify_connectivity(): ", driver.verify_connectivity())
-    #
-    # print("slot_based_query: ", slot_based_query)
 
+async def get_relationship_1_variable(slot_based_query):
     if isinstance(slot_based_query, list):
         slot_based_query = slot_based_query[0]
     else:
         print("The variable is not a list.")
 
-    # function_to_call = None  # Initialize function_to_call
-
-    # Check if the input is a four-digit year using regex for publication year
-    year_pattern = re.match(r'^\d{4}$', slot_based_query)
-    if year_pattern:
-        # Directly assign the function if it's a year
-        function_to_call = 'print_publicationyear'
-    else:
-        # Use fuzzy matching to find the closest entity
-        # closest_match, match_score = process.extractOne(slot_based_query, ENTITY_FUNCTION_MAPPING.keys())
-        # print("match_score: ", match_score)
-
-        # Fuzzy match against book titles
-        collection_match, collection_score = process.extractOne(slot_based_query, KNOWN_COLLECTIONS)
-
-        # Fuzzy match against book titles
-        floor_match, floor_score = process.extractOne(slot_based_query, KNOWN_FLOORS)
-
-        # if match_score >= 60 and (match_score >= floor_score or floor_score < 60):
-        #     # Choose entity function if it has higher or equal score and is above the threshold
-        #     slot_based_query = closest_match
-        #     function_to_call = ENTITY_FUNCTION_MAPPING.get(slot_based_query)
-        #     # print("function_to_call (entity): ", function_to_call)
-        if collection_score >= 60:
-            # Choose collection function if it has higher score and is above the threshold
-            ENTITY_FUNCTION_MAPPING[slot_based_query] = 'print_collection'
-            function_to_call = 'print_collection'
-            slot_based_query = collection_match
-            # print("function_to_call (collection): ", function_to_call)
-        elif floor_score >= 60:
-            # Choose book title function if it has higher score and is above the threshold
-            ENTITY_FUNCTION_MAPPING[slot_based_query] = 'print_floor'
-            function_to_call = 'print_floor'
-            slot_based_query = floor_match
-            # print("function_to_call (book title): ", function_to_call)
-        else:
-            # print("Δεν βρέθηκε αντιστοίχιση για: ", slot_based_query)
-            return []
-
-    # Validation logic to confirm the matched function is appropriate
-    if function_to_call not in ['print_collection', 'print_floor']:
-        # print(f"The function {function_to_call} may not be suitable for the query: {slot_based_query}")
+    # A four-digit publication year first, then known collections, then floors
+    kind, parameter = parse_slot(slot_based_query, ('year', 'collection', 'floor'))
+    if kind is None:
+        # print("Δεν βρέθηκε αντιστοίχιση για: ", slot_based_query)
         return []
 
-    with driver.session() as session:
-        if function_to_call == 'print_floor':
-            # print("mpike floor!")
-            query_exhibition_names, query_exhibition_url = session.read_transaction(print_floor, slot_based_query)
-            driver.close()
-            return query_exhibition_names, query_exhibition_url
-
-        elif function_to_call == 'print_collection':
-            # print("mpike collection!")
-            query_exhibition_names = session.read_transaction(print_collection, slot_based_query)
-            driver.close()
-            return query_exhibition_names
+    # Single table lookup, no per-request state
+    handler = QUERY_HANDLERS[kind]
+    if handler.query is None:
+        # print(f"Δεν έχω βάλει ακόμα query για: {slot_based_query}")
+        return []
 
-        else:
-            # print("Δεν έχω βάλει ακόμα query για: ", slot_based_query)
-            driver.close()
-            return []
+    # The floor query returns (names, urls), the collection query returns names only
+    return await fetch_exhibits(handler, parameter)
 
 
 def has_entity_type(entities, type):
@@ -534,7 +600,8 @@ class ActionHallExhibitions(Action):
     def name(self) -> Text:
         return "action_hall_exhibitions"
 
-    def run(
+    @metrics.timed_action
+    async def run(
             self,
             dispatcher: CollectingDispatcher,
             tracker: Tracker,
@@ -563,7 +630,13 @@ class ActionHallExhibitions(Action):
 
             collection = extract_entity(entities, "collection", collection)
 
-            exhibition_names, url = get_relationship_2_variables(hall, collection)
+            filters = message_filters(entities)
+            if filters.count() > 1:
+                # Compound question (e.g. hall and collection): a single combined round trip
+                selection = await fetch_filtered_exhibits(filters)
+                exhibition_names, url = selection.exhibition_names, selection.urls
+            else:
+                exhibition_names, url = await get_relationship_2_variables(hall, collection)
             # print("exhibition_names: ", exhibition_names)
             # print("url: ", url)
 
@@ -590,6 +663,7 @@ class ActionUtterGraphOutputHallExhibitions(Action):
     def name(self) -> Text:
         return "action_utter_graph_output_hall_exhibitions"
 
+    @metrics.timed_action
     def run(
             self,
             dispatcher: CollectingDispatcher,
@@ -624,7 +698,8 @@ class ActionCollectionExhibitions(Action):
     def name(self) -> Text:
         return "action_collection_exhibitions"
 
-    def run(
+    @metrics.timed_action
+    async def run(
             self,
             dispatcher: CollectingDispatcher,
             tracker: Tracker,
@@ -649,7 +724,12 @@ class ActionCollectionExhibitions(Action):
 
             collection = extract_entity(entities, "collection", collection)
 
-            exhibition_names = get_relationship_1_variable(collection)
+            filters = message_filters(entities)
+            if filters.count() > 1:
+                # Compound question (e.g. collection and floor): a single combined round trip
+                exhibition_names = (await fetch_filtered_exhibits(filters)).exhibition_names
+            else:
+                exhibition_names = await get_relationship_1_variable(collection)
             # print("query_type1: ", exhibition_names)
             # print("query_type2:", url)
 
@@ -674,6 +754,7 @@ class ActionUtterGraphOutputCollectionExhibitions(Action):
     def name(self) -> Text:
         return "action_utter_graph_output_collection_exhibitions"
 
+    @metrics.timed_action
     def run(
             self,
             dispatcher: CollectingDispatcher,
@@ -707,7 +788,8 @@ class ActionCollectionExhibitionsAndShowcase(Action):
     def name(self) -> Text:
         return "action_collection_exhibitions_and_showcase"
 
-    def run(
+    @metrics.timed_action
+    async def run(
             self,
             dispatcher: CollectingDispatcher,
             tracker: Tracker,
@@ -736,7 +818,13 @@ class ActionCollectionExhibitionsAndShowcase(Action):
 
             showcase = extract_entity(entities, "showcase", showcase)
 
-            exhibition_names, url = get_relationship_collection_with_showcase(collection, showcase)
+            filters = message_filters(entities)
+            if filters.count() > 1:
+                # Compound question (collection and showcase): a single combined round trip
+                selection = await fetch_filtered_exhibits(filters)
+                exhibition_names, url = selection.exhibition_names, selection.urls
+            else:
+                exhibition_names, url = await get_relationship_collection_with_showcase(collection, showcase)
             # print("query_type1: ", exhibition_names)
             # print("query_type2:", url)
 
@@ -763,6 +851,7 @@ class ActionUtterGraphOutputCollectionExhibitionsAndShowcase(Action):
     def name(self) -> Text:
         return "action_utter_graph_output_collection_exhibitions_and_showcase"
 
+    @metrics.timed_action
     def run(
             self,
             dispatcher: CollectingDispatcher,
@@ -798,7 +887,8 @@ class ActionFloorExhibits(Action):
     def name(self) -> Text:
         return "action_floor_exhibits"
 
-    def run(
+    @metrics.timed_action
+    async def run(
             self,
             dispatcher: CollectingDispatcher,
             tracker: Tracker,
@@ -823,7 +913,13 @@ class ActionFloorExhibits(Action):
 
             floor = extract_entity(entities, "floor", floor)
 
-            exhibition_names, url = get_relationship_1_variable(floor)
+            filters = message_filters(entities)
+            if filters.count() > 1:
+                # Compound question (e.g. floor and collection): a single combined round trip
+                selection = await fetch_filtered_exhibits(filters)
+                exhibition_names, url = selection.exhibition_names, selection.urls
+            else:
+                exhibition_names, url = await get_relationship_1_variable(floor)
             # print("query_type1: ", exhibition_names)
             # print("query_type2:", url)
 
@@ -849,6 +945,7 @@ class ActionUtterGraphOutputFloorExhibits(Action):
     def name(self) -> Text:
         return "action_utter_graph_output_floor_exhibits"
 
+    @metrics.timed_action
     def run(
             self,
             dispatcher: CollectingDispatcher,
@@ -884,6 +981,7 @@ class ActionSetReminder(Action):
     def name(self) -> Text:
         return "action_set_reminder"
 
+    @metrics.timed_action
     async def run(
             self,
             dispatcher: CollectingDispatcher,
@@ -912,6 +1010,7 @@ class ActionReactToReminder(Action):
     def name(self) -> Text:
         return "action_react_to_reminder"
 
+    @metrics.timed_action
     async def run(
             self,
             dispatcher: CollectingDispatcher,
@@ -935,6 +1034,7 @@ class ActionCreateCollectionsCarousels(Action):
     def name(self) -> Text:
         return "action_create_collections_carousels"
 
+    @metrics.timed_action
     def run(
             self,
             dispatcher: CollectingDispatcher,
@@ -944,98 +1044,8 @@ class ActionCreateCollectionsCarousels(Action):
         dispatcher.utter_message(
             text='Καλώς ήρθατε στον ψηφιακό βοηθό για τις συλλογές και τα εκθέματα του μουσείου "Νίκος Καζαντζάκης". Ονομάζομαι Exhibit και θα σας παρουσιάσω τα πιο εμβληματικά εκθέματα του μουσείου. Ένας έξυπνος γράφος γνώσης είναι συνδεδεμένος με τον Exhibit για την παροχή πιο εξειδικευμένων πληροφοριών σχετικά με τα εκθέματα του μουσείου.')
 
-        # Τα keys για το json υπάρχουν στο παρακάτω link
-        # https://github.com/botfront/rasa-webchat/blob/010c0539a6c57c426d090c7c8c1ca768ec6c81dc/src/components/Widget/components/Conversation/components/Messages/components/Carousel/index.js
-        message = {
-            "type": "template",
-            "payload": {
-                "template_type": "generic",
-                "elements": [
-                    {
-                        "title": "Βιογραφικά στοιχεία",
-                        "subtitle": "Παιδικά χρόνια, Σύζυγοι, Φίλοι, Προσωπικά αντικείμενα",
-                        "image_url": "https://www.memobot.eu/wp-content/uploads/2022/10/βιογραφικά-στοιχεία.jpg",
-                        "buttons": [
-                            {
-                                "title": "Μάθε για την ενότητα",
-                                "payload": "/viografika_stoixeia",
-                                "type": "postback"
-                            },
-                            {
-                                "title": "Εκθέματα",
-                                "payload": "Εκθέματα αίθουσας Βιογραφικά",
-                                "type": "postback"
-                            },
-                        ]
-                    },
-                    {
-                        "title": "Η 'Οδύσεια'",
-                        "subtitle": "Μεγαλόπνοο έπος του Καζαντζάκη",
-                        "image_url": "https://www.memobot.eu/wp-content/uploads/2022/10/οδύσσεια.jpg",
-                        "buttons": [
-                            {
-                                "title": "Μάθε για την ενότητα",
-                                "payload": "/odusseia",
-                                "type": "postback"
-                            },
-                            {
-                                "title": "Εκθέματα",
-                                "payload": "Εκθέματα αίθουσας Οδύσσεια",
-                                "type": "postback"
-                            },
-                        ]
-                    },
-                    {
-                        "title": "Επιρροές",
-                        "subtitle": "Επιστολές & Προσωρινά εκθέματα ",
-                        "image_url": "https://www.memobot.eu/wp-content/uploads/2022/10/φιλοι-κ-επιρροες-1024x681-1.jpg",
-                        "buttons": [
-                            {
-                                "title": "Μάθε για την ενότητα",
-                                "payload": "/filoi_epirroes",
-                                "type": "postback"
-                            },
-                        ]
-                    },
-                    {
-                        "title": "Πρώιμα έργα",
-                        "subtitle": "Θεατρικά, Παιδικά βιβλία και η 'Ασκητική'",
-                        "image_url": "https://www.memobot.eu/wp-content/uploads/2022/10/πρώιμα-θεατρικά-εργα.jpg",
-                        "buttons": [
-                            {
-                                "title": "Μάθε για την ενότητα",
-                                "payload": "/proima_theatrika",
-                                "type": "postback"
-                            },
-                            {
-                                "title": "Εκθέματα",
-                                "payload": "ευρήματα από Θέατρο",
-                                "type": "postback"
-                            },
-                        ]
-                    },
-                    {
-                        "title": "Μυθιστορήματα",
-                        "subtitle": "'Ταξιδεύοντας...', Αναγνωστήριο, Σινεμά, Πολιτική και μελέτες για τον Καζαντζάκη",
-                        "image_url": "https://www.memobot.eu/wp-content/uploads/2022/10/μυθιστορηματα-1024x511-1.jpg",
-                        "buttons": [
-                            {
-                                "title": "Μάθε για την ενότητα",
-                                "payload": "/mithistorimata",
-                                "type": "postback"
-                            },
-                            {
-                                "title": "Εκθέματα",
-                                "payload": "Ποια εκθεματα έχει η αίθουσα Μυθιστορήματα",
-                                "type": "postback"
-                            },
-                        ]
-                    }
-                ]
-            }
-        }
-
-        dispatcher.utter_message(attachment=message)
+        # Shared, frozen carousel built once at import from carousels.yml
+        dispatcher.utter_message(attachment=carousels.COLLECTIONS_CAROUSEL.attachment)
 
         return []
 
@@ -1044,6 +1054,7 @@ class ActionThematikesGeneral(Action):
     def name(self) -> Text:
         return "action_thematikes_general"
 
+    @metrics.timed_action
     def run(
             self,
             dispatcher: CollectingDispatcher,
@@ -1053,98 +1064,8 @@ class ActionThematikesGeneral(Action):
         dispatcher.utter_message(
             text='Στη Μόνιμη Έκθεση, οι επισκέπτες έχουν την ευκαιρία να εξοικειωθούν με την προσωπικότητα του συγγραφέα μέσα από τις επιστολές και τα ημερολόγιά του, από προσωπικά αντικείμενα και ενθύμια των ταξιδιών του, από δυσεύρετες φωτογραφίες, από μακέτες σκηνικών και κοστουμιών, από παραστάσεις έργων του, από σπάνιο οπτικοακουστικό υλικό, καθώς και από έργα τέχνης εμπνευσμένα από τον λογοτεχνικό του κόσμο. \n \n Το φυσικό υλικό, μαζί με ψηφιακές αναπαραγωγές, αναπτύσσεται σε πέντε θεματικές ενότητες: 1) Ο άνθρωπος Καζαντζάκης - Βιογραφικά, 2) Η «Οδύσεια» του Καζαντζάκη, 3) Αλληλογραφία, φίλοι και επιρροές, 4) Πρώιμα και θεατρικά έργα και 5) Μυθιστορήματα και ταξιδιωτικά έργα.')
 
-        # Τα keys για το json υπάρχουν στο παρακάτω link
-        # https://github.com/botfront/rasa-webchat/blob/010c0539a6c57c426d090c7c8c1ca768ec6c81dc/src/components/Widget/components/Conversation/components/Messages/components/Carousel/index.js
-        message = {
-            "type": "template",
-            "payload": {
-                "template_type": "generic",
-                "elements": [
-                    {
-                        "title": "Βιογραφικά στοιχεία",
-                        "subtitle": "Παιδικά χρόνια, Σύζυγοι, Φίλοι, Προσωπικά αντικείμενα",
-                        "image_url": "https://www.memobot.eu/wp-content/uploads/2022/10/βιογραφικά-στοιχεία.jpg",
-                        "buttons": [
-                            {
-                                "title": "Μάθε για την ενότητα",
-                                "payload": "/viografika_stoixeia",
-                                "type": "postback"
-                            },
-                            {
-                                "title": "Εκθέματα",
-                                "payload": "Εκθέματα αίθουσας Βιογραφικά",
-                                "type": "postback"
-                            },
-                        ]
-                    },
-                    {
-                        "title": "Η 'Οδύσεια'",
-                        "subtitle": "Μεγαλόπνοο έπος του Καζαντζάκη",
-                        "image_url": "https://www.memobot.eu/wp-content/uploads/2022/10/οδύσσεια.jpg",
-                        "buttons": [
-                            {
-                                "title": "Μάθε για την ενότητα",
-                                "payload": "/odusseia",
-                                "type": "postback"
-                            },
-                            {
-                                "title": "Εκθέματα",
-                                "payload": "Εκθέματα αίθουσας Οδύσσεια",
-                                "type": "postback"
-                            },
-                        ]
-                    },
-                    {
-                        "title": "Επιρροές",
-                        "subtitle": "Επιστολές & Προσωρινά εκθέματα ",
-                        "image_url": "https://www.memobot.eu/wp-content/uploads/2022/10/φιλοι-κ-επιρροες-1024x681-1.jpg",
-                        "buttons": [
-                            {
-                                "title": "Μάθε για την ενότητα",
-                                "payload": "/filoi_epirroes",
-                                "type": "postback"
-                            },
-                        ]
-                    },
-                    {
-                        "title": "Πρώιμα έργα",
-                        "subtitle": "Θεατρικά, Παιδικά βιβλία και η 'Ασκητική'",
-                        "image_url": "https://www.memobot.eu/wp-content/uploads/2022/10/πρώιμα-θεατρικά-εργα.jpg",
-                        "buttons": [
-                            {
-                                "title": "Μάθε για την ενότητα",
-                                "payload": "/proima_theatrika",
-                                "type": "postback"
-                            },
-                            {
-                                "title": "Εκθέματα",
-                                "payload": "ευρήματα από Θέατρο",
-                                "type": "postback"
-                            },
-                        ]
-                    },
-                    {
-                        "title": "Μυθιστορήματα",
-                        "subtitle": "'Ταξιδεύοντας...', Αναγνωστήριο, Σινεμά, Πολιτική και μελέτες για τον Καζαντζάκη",
-                        "image_url": "https://www.memobot.eu/wp-content/uploads/2022/10/μυθιστορηματα-1024x511-1.jpg",
-                        "buttons": [
-                            {
-                                "title": "Μάθε για την ενότητα",
-                                "payload": "/mithistorimata",
-                                "type": "postback"
-                            },
-                            {
-                                "title": "Εκθέματα",
-                                "payload": "Ποια εκθεματα έχει η αίθουσα Μυθιστορήματα",
-                                "type": "postback"
-                            },
-                        ]
-                    }
-                ]
-            }
-        }
-
-        dispatcher.utter_message(attachment=message)
+        # Shared, frozen carousel built once at import from carousels.yml
+        dispatcher.utter_message(attachment=carousels.COLLECTIONS_CAROUSEL.attachment)
 
         return []
 
@@ -1154,6 +1075,7 @@ class ActionGoodbye(Action):
     def name(self) -> Text:
         return "action_goodbye"
 
+    @metrics.timed_action
     async def run(
             self,
             dispatcher: CollectingDispatcher,
@@ -1169,39 +1091,63 @@ class ActionGoodbye(Action):
 
         return []
 
-# Load the responses from the JSON file just ONCE
-with open('actions/genai_placeholders.yml', 'r', encoding='utf-8') as f:
-    genai_data = yaml.safe_load(f)
-
-load_dotenv()
-
 #* Generative service endpoints
 GENAI_BASE_URL = os.getenv("FASTAPI_APP_URL")
 OPENAI_RESPONSE_ENDPOINT = os.getenv("OPENAI_RESPONSE_ENDPOINT")
-CHAT_MODEL = CHAT_MODEL = genai_data["models"]["chat"]
+
+
+# The fallback answer cache reads and writes its SQLite file (and the first call opens it), so it is
+# only used from a worker thread, off the event loop.
+def _cached_fallback_answer(query, prompt_version):
+    cache = fallback_cache.get_cache()
+    if cache is None:
+        return None
+    # Answers are only kept for the current prompts: a prompt change drops those of the old ones
+    cache.retain_version(prompt_version)
+    return cache.get(query, prompt_version)
+
+
+def _store_fallback_answer(query, prompt_version, messages):
+    cache = fallback_cache.get_cache()
+    if cache is not None:
+        cache.put(query, prompt_version, messages)
+
 
 class ActionDefaultFallback(Action):
 
     def name(self) -> Text:
         return "action_default_fallback"
 
-    def run(self, dispatcher: CollectingDispatcher,
-            tracker: Tracker,
-            domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
+    @metrics.timed_action
+    async def run(self, dispatcher: CollectingDispatcher,
+                  tracker: Tracker,
+                  domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
 
         user_query = tracker.latest_message.get("text")
         print(user_query)
-        # Call your RAG model API
-        response = utils.action_openai_chat_completion(
+
+        config = genai_config.get_config()
+
+        # The same (or almost the same) question was answered before
+        loop = asyncio.get_running_loop()
+        cached = await loop.run_in_executor(None, _cached_fallback_answer, user_query, config.fallback_prompt_version)
+        if cached is not None:
+            metrics.FALLBACK_CACHE_TOTAL.inc("exact" if cached.score == 1.0 else "near")
+            for text_response in cached.messages:
+                dispatcher.utter_message(text=text_response)
+            return []
+        metrics.FALLBACK_CACHE_TOTAL.inc("miss")
+
+        # Call your RAG model API. Awaited on the event loop, so the other actions keep being
+        # served while the answer is generated; the answer is uttered by the call itself.
+        answer = await utils.async_openai_chat_completion(
             dispatcher,
-            system_prompt=genai_data["tasks"]["fallback_prompts"]["system_prompt"],
-            user_prompt=genai_data["tasks"]["fallback_prompts"]["user_prompt"].format(
-                query=user_query),
-            chat_model=CHAT_MODEL,
+            system_prompt=config.fallback_system_prompt,
+            user_prompt=config.fallback_user_prompt.format(query=user_query),
+            chat_model=config.chat_model,
             endpoint_url=f"{GENAI_BASE_URL}/{OPENAI_RESPONSE_ENDPOINT}"
         )
-
-        # Send the response back to the user
-        dispatcher.utter_message(text=response)
+        if answer:
+            await loop.run_in_executor(None, _store_fallback_answer, user_query, config.fallback_prompt_version, answer)
 
         return []
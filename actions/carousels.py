@@ -0,0 +1,103 @@
+"""
+Static carousel payloads of the webchat widget, built once at import.
+
+The carousels are defined as data in actions/carousels.yml. At import each one
+is validated against the rasa-webchat generic template, wrapped in the
+template message and frozen: the actions hand the same immutable object to
+every dispatcher.utter_message(attachment=...), so answering the welcome
+message allocates none of these structures.
+
+A malformed carousels.yml fails the import, i.e. the action server start,
+instead of the first visitor's welcome message.
+"""
+
+from pathlib import Path
+from typing import NamedTuple
+
+import yaml
+
+CAROUSELS_PATH = Path(__file__).resolve().parent / "carousels.yml"
+
+ELEMENT_KEYS = ("title", "subtitle", "image_url", "buttons")
+BUTTON_KEYS = ("title", "payload", "type")
+BUTTON_TYPES = ("postback", "web_url")
+
+
+class FrozenDict(dict):
+    """A dict that refuses changes. Still a dict, so every JSON encoder serializes it natively."""
+
+    def _immutable(self, *args, **kwargs):
+        raise TypeError("carousel payloads are shared between requests and cannot be modified")
+
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = _immutable
+    __ior__ = _immutable
+
+    def __hash__(self):
+        return hash(tuple(self.items()))
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return FrozenDict((key, _freeze(item)) for key, item in value.items())
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def _validate(name, elements):
+    if not isinstance(elements, list) or not elements:
+        raise ValueError(f"Carousel {name!r} needs a non-empty list of elements")
+
+    for position, element in enumerate(elements, start=1):
+        where = f"carousel {name!r}, element {position}"
+        missing = [key for key in ELEMENT_KEYS if key not in element]
+        if missing:
+            raise ValueError(f"{where}: missing {', '.join(missing)}")
+        for key in ("title", "subtitle", "image_url"):
+            if not isinstance(element[key], str) or not element[key]:
+                raise ValueError(f"{where}: {key} must be a non-empty string")
+        if not element["image_url"].startswith("https://"):
+            raise ValueError(f"{where}: image_url must be an https URL")
+
+        for button in element["buttons"]:
+            missing = [key for key in BUTTON_KEYS if not button.get(key)]
+            if missing:
+                raise ValueError(f"{where}: button without {', '.join(missing)}")
+            if button["type"] not in BUTTON_TYPES:
+                raise ValueError(f"{where}: unknown button type {button['type']!r}")
+
+
+class Carousel(NamedTuple):
+    attachment: FrozenDict  # pass to dispatcher.utter_message(attachment=...)
+
+
+def load_carousels(path=CAROUSELS_PATH):
+    """Read, validate and freeze every carousel of the YAML file."""
+    with open(path, "r", encoding="utf-8") as f:
+        definitions = (yaml.safe_load(f) or {}).get("carousels") or {}
+
+    carousels = {}
+    for name, elements in definitions.items():
+        _validate(name, elements)
+        message = {
+            "type": "template",
+            "payload": {
+                "template_type": "generic",
+                "elements": elements,
+            },
+        }
+        carousels[name] = Carousel(_freeze(message))
+
+    return FrozenDict(carousels)
+
+
+CAROUSELS = load_carousels()
+
+# The thematic sections of the permanent exhibition (welcome message and action_thematikes_general)
+COLLECTIONS_CAROUSEL = CAROUSELS["collections"]
@@ -0,0 +1,173 @@
+"""
+Every Cypher statement the action server sends to Neo4j, plus the schema it relies on.
+
+The strings live here rather than inline in the graph helpers so that
+scripts/neo4j-schema-bootstrap can create the indexes and EXPLAIN each query
+without importing the Rasa action server. This module must stay dependency-free.
+"""
+
+import itertools
+from types import SimpleNamespace
+
+# --------------------------------------------------------------------------
+# Schema: indexes and constraints the queries below are planned against.
+# Every statement is idempotent (IF NOT EXISTS).
+# --------------------------------------------------------------------------
+SCHEMA_STATEMENTS = [
+    "CREATE CONSTRAINT hall_name_unique IF NOT EXISTS FOR (hall:HALL) REQUIRE hall.name IS UNIQUE",
+    "CREATE INDEX hall_floor IF NOT EXISTS FOR (hall:HALL) ON (hall.floor)",
+    "CREATE INDEX exhibit_collection IF NOT EXISTS FOR (exhibits:EXHIBIT) ON (exhibits.collection)",
+    "CREATE INDEX exhibit_showcase IF NOT EXISTS FOR (exhibits:EXHIBIT) ON (exhibits.showcase)",
+    "CREATE INDEX exhibit_collection_showcase IF NOT EXISTS "
+    "FOR (exhibits:EXHIBIT) ON (exhibits.collection, exhibits.showcase)",
+    "CREATE INDEX writer_name IF NOT EXISTS FOR (a:WRITER) ON (a.name)",
+]
+
+# --------------------------------------------------------------------------
+# Graph helpers of actions.py. All of them sample on the server.
+# --------------------------------------------------------------------------
+BOOKS_BY_TYPE_QUERY = (
+    "CALL { "
+    "    MATCH (a:WRITER)-[:WROTE]->(book) "
+    "    WHERE a.name = 'Νίκος Καζαντζάκης' AND book.type_pl = $book_type_pl "
+    "    RETURN count(book) AS total "
+    "} "
+    "MATCH (a:WRITER)-[:WROTE]->(book) "
+    "WHERE a.name = 'Νίκος Καζαντζάκης' AND book.type_pl = $book_type_pl "
+    "RETURN total, book.name AS name "
+    "ORDER BY rand() LIMIT $limit"
+)
+
+HALL_EXHIBITS_QUERY = (
+    "MATCH (exhibits:EXHIBIT) - [:ISLOCATEDIN] -> (hall:HALL) "
+    "WHERE hall.name = $hall_name "
+    "RETURN exhibits.name AS name, exhibits.url AS url "
+    "ORDER BY rand() LIMIT $limit"
+)
+
+HALL_COLLECTION_EXHIBITS_QUERY = (
+    "MATCH (exhibits:EXHIBIT) - [:ISLOCATEDIN] -> (hall:HALL) "
+    "WHERE hall.name = $hall_name AND exhibits.collection = $exhibits_collection "
+    "RETURN exhibits.name AS name, exhibits.url AS url "
+    "ORDER BY rand() LIMIT $limit"
+)
+
+COLLECTION_EXHIBITS_QUERY = (
+    "MATCH (exhibits:EXHIBIT) - [:ISLOCATEDIN] -> (hall:HALL) "
+    "WHERE exhibits.collection = $exhibits_collection "
+    "RETURN exhibits.name AS name "
+    "ORDER BY rand() LIMIT $limit"
+)
+
+COLLECTION_SHOWCASE_EXHIBITS_QUERY = (
+    "MATCH (exhibits:EXHIBIT) "
+    "WHERE exhibits.collection = $exhibits_collection AND exhibits.showcase = $exhibits_showcase "
+    "RETURN exhibits.name AS name, exhibits.url AS url "
+    "ORDER BY rand() LIMIT $limit"
+)
+
+FLOOR_EXHIBITS_QUERY = (
+    "MATCH (exhibits:EXHIBIT) - [:ISLOCATEDIN] -> (hall:HALL) "
+    "WHERE hall.floor = $floor "
+    "RETURN exhibits.name AS name, exhibits.url AS url "
+    "ORDER BY rand() LIMIT $limit"
+)
+
+
+def build_filtered_exhibits_query(filters):
+    """
+    One parameterized Cypher query for every filter of a compound question.
+    Each filter is an IN $list predicate, and only the filters the message carries are added, so the
+    planner can still use the property indexes.
+    """
+    exhibit_predicates = []
+    hall_predicates = []
+    if filters.collections:
+        exhibit_predicates.append("exhibits.collection IN $collections")
+    if filters.showcases:
+        exhibit_predicates.append("exhibits.showcase IN $showcases")
+    if filters.halls:
+        hall_predicates.append("hall.name IN $halls")
+    if filters.floors:
+        hall_predicates.append("hall.floor IN $floors")
+
+    if hall_predicates:
+        # Hall or floor filter: only exhibits located in a matching hall
+        query = ("MATCH (exhibits:EXHIBIT) - [:ISLOCATEDIN] -> (hall:HALL) "
+                 "WHERE " + " AND ".join(hall_predicates + exhibit_predicates) + " ")
+    else:
+        query = "MATCH (exhibits:EXHIBIT) "
+        if exhibit_predicates:
+            query += "WHERE " + " AND ".join(exhibit_predicates) + " "
+        query += "OPTIONAL MATCH (exhibits) - [:ISLOCATEDIN] -> (hall:HALL) "
+
+    query += ("RETURN exhibits.name AS name, exhibits.url AS url, hall.name AS hall, "
+              "exhibits.collection AS collection, exhibits.showcase AS showcase, hall.floor AS floor "
+              "ORDER BY rand() LIMIT $limit")
+
+    params = {
+        "halls": list(filters.halls),
+        "collections": list(filters.collections),
+        "showcases": list(filters.showcases),
+        "floors": list(filters.floors),
+    }
+    return query, params
+
+
+FILTER_KINDS = ("halls", "collections", "showcases", "floors")
+
+
+def filtered_exhibits_queries():
+    """
+    Every distinct statement build_filtered_exhibits_query() can produce, keyed by the tuple of
+    filter kinds it constrains (the empty tuple included).
+    """
+    queries = {}
+    for size in range(len(FILTER_KINDS) + 1):
+        for chosen in itertools.combinations(FILTER_KINDS, size):
+            filters = SimpleNamespace(**{kind: ["x"] if kind in chosen else [] for kind in FILTER_KINDS})
+            queries[chosen] = build_filtered_exhibits_query(filters)[0]
+    return queries
+
+
+# --------------------------------------------------------------------------
+# Exhibit catalog: full loads, expected to scan the labels.
+# --------------------------------------------------------------------------
+LOAD_EXHIBITS_QUERY = (
+    "MATCH (exhibits:EXHIBIT) "
+    "OPTIONAL MATCH (exhibits) - [:ISLOCATEDIN] -> (hall:HALL) "
+    "RETURN exhibits.name AS name, exhibits.url AS url, "
+    "exhibits.collection AS collection, exhibits.showcase AS showcase, "
+    "hall.name AS hall, hall.floor AS floor"
+)
+
+LOAD_HALLS_QUERY = (
+    "MATCH (hall:HALL) "
+    "RETURN hall.name AS name, hall.floor AS floor"
+)
+
+VERSION_MARKER_QUERY = (
+    "CALL { OPTIONAL MATCH (m:KG_VERSION) RETURN max(m.version) AS version } "
+    "CALL { MATCH (exhibits:EXHIBIT) RETURN count(exhibits) AS exhibits } "
+    "CALL { MATCH (hall:HALL) RETURN count(hall) AS halls } "
+    "RETURN version, exhibits, halls"
+)
+
+# Queries that read whole labels on purpose and are not checked for index usage
+FULL_SCAN_QUERIES = {
+    "LOAD_EXHIBITS_QUERY": LOAD_EXHIBITS_QUERY,
+    "LOAD_HALLS_QUERY": LOAD_HALLS_QUERY,
+    "VERSION_MARKER_QUERY": VERSION_MARKER_QUERY,
+}
+
+# Every point query with example parameters of the right types, for EXPLAIN
+INDEXED_QUERIES = {
+    "BOOKS_BY_TYPE_QUERY": (BOOKS_BY_TYPE_QUERY, {"book_type_pl": "μυθιστορήματα"}),
+    "HALL_EXHIBITS_QUERY": (HALL_EXHIBITS_QUERY, {"hall_name": "Θέατρο"}),
+    "HALL_COLLECTION_EXHIBITS_QUERY": (HALL_COLLECTION_EXHIBITS_QUERY,
+                                       {"hall_name": "Θέατρο", "exhibits_collection": "Θέατρο"}),
+    "COLLECTION_EXHIBITS_QUERY": (COLLECTION_EXHIBITS_QUERY, {"exhibits_collection": "Θέατρο"}),
+    "COLLECTION_SHOWCASE_EXHIBITS_QUERY": (COLLECTION_SHOWCASE_EXHIBITS_QUERY,
+                                           {"exhibits_collection": "Θέατρο", "exhibits_showcase": 1}),
+    "FLOOR_EXHIBITS_QUERY": (FLOOR_EXHIBITS_QUERY, {"floor": "1ος"}),
+}
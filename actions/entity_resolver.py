@@ -0,0 +1,143 @@
+"""
+Greek-aware resolver from raw slot values to canonical hall / collection / floor names.
+
+At import the known entity lists plus the synonyms and lookup tables of
+data/nlu.yml are compiled into one dictionary per entity kind, keyed by the
+normalised spelling (accents and tonos folded, case folded, final sigma folded).
+Resolution is then:
+  1. an LRU memo of raw value -> result (most slot values repeat constantly),
+  2. an exact hash lookup of the normalised value,
+  3. only on a miss, fuzzy scoring against the normalised canonical names of that kind.
+"""
+
+import logging
+import os
+import re
+import unicodedata
+from functools import lru_cache
+from pathlib import Path
+
+import yaml
+from thefuzz import process
+
+logger = logging.getLogger(__name__)
+
+# data/nlu.yml is next to the actions package in the repository; the standalone actions image
+# only ships the actions folder, so docker-compose.yml mounts the file and sets this path.
+NLU_DATA_PATH = os.getenv(
+    "NLU_DATA_PATH",
+    str(Path(__file__).resolve().parent.parent / "data" / "nlu.yml"),
+)
+
+FUZZY_THRESHOLD = 60
+
+# Very short names ("1ος") are only matched exactly: partial fuzzy scoring would find them inside
+# almost any word once the final sigma is folded
+FUZZY_MIN_LENGTH = 4
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize(text):
+    """Fold accents/tonos/dialytika, case and final sigma and collapse whitespace."""
+    decomposed = unicodedata.normalize("NFD", str(text))
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    folded = stripped.casefold().replace("ς", "σ")
+    return _WHITESPACE.sub(" ", folded).strip()
+
+
+def _read_nlu_entities(path):
+    """Return (synonyms, lookups): canonical -> examples and lookup name -> examples."""
+    synonyms = {}
+    lookups = {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            nlu_data = yaml.safe_load(f) or {}
+    except OSError as e:
+        logger.error("NLU data not found at %s: synonyms and lookup tables are NOT applied, "
+                     "resolving against the known lists only (set NLU_DATA_PATH): %s", path, e)
+        return synonyms, lookups
+
+    for item in nlu_data.get("nlu", []):
+        examples = [line.lstrip("- ").strip() for line in str(item.get("examples", "")).splitlines()]
+        examples = [example for example in examples if example]
+        if "synonym" in item:
+            synonyms.setdefault(str(item["synonym"]), []).extend(examples)
+        elif "lookup" in item:
+            lookups.setdefault(str(item["lookup"]), []).extend(examples)
+
+    return synonyms, lookups
+
+
+class EntityResolver:
+
+    def __init__(self, known_entities, nlu_path=NLU_DATA_PATH, memo_size=4096, threshold=FUZZY_THRESHOLD):
+        """
+        known_entities: dict of entity kind (e.g. "hall") -> list of canonical names.
+        """
+        self.threshold = threshold
+        self._index = {kind: {} for kind in known_entities}
+
+        for kind, canonicals in known_entities.items():
+            for canonical in canonicals:
+                self._index[kind][normalize(canonical)] = canonical
+
+        synonyms, lookups = _read_nlu_entities(nlu_path)
+
+        # Synonym examples map straight to their canonical value, for whichever kind knows it
+        for kind, canonicals in known_entities.items():
+            for canonical in canonicals:
+                for example in synonyms.get(canonical, []):
+                    self._index[kind].setdefault(normalize(example), canonical)
+
+        # Lookup table entries without a synonym are resolved once, here, by fuzzy matching
+        for kind in known_entities:
+            choices = self._fuzzy_choices(kind)
+            for example in lookups.get(kind, []):
+                key = normalize(example)
+                if key not in self._index[kind]:
+                    canonical = self._fuzzy(kind, key, choices)
+                    if canonical is not None:
+                        self._index[kind][key] = canonical
+
+        self._choices = {kind: self._fuzzy_choices(kind) for kind in self._index}
+        self._resolve_cached = lru_cache(maxsize=memo_size)(self._resolve)
+
+    def _fuzzy_choices(self, kind):
+        # Fuzzy scoring only runs against the canonical names, like the original per-call extractOne;
+        # the inflected spellings from nlu.yml are matched exactly
+        return [key for key, canonical in self._index[kind].items()
+                if key == normalize(canonical) and len(key) >= FUZZY_MIN_LENGTH]
+
+    def _fuzzy(self, kind, key, choices):
+        if not choices:
+            return None
+        match, score = process.extractOne(key, choices)
+        if score >= self.threshold:
+            return self._index[kind][match]
+        return None
+
+    def _resolve(self, value, kinds):
+        key = normalize(value)
+
+        for kind in kinds:
+            canonical = self._index[kind].get(key)
+            if canonical is not None:
+                return kind, canonical
+
+        for kind in kinds:
+            canonical = self._fuzzy(kind, key, self._choices[kind])
+            if canonical is not None:
+                return kind, canonical
+
+        return None, None
+
+    def resolve(self, value, kinds):
+        """
+        Resolve a raw slot value against the given entity kinds, tried in priority order.
+        Returns (kind, canonical name) or (None, None).
+        """
+        return self._resolve_cached(str(value), tuple(kinds))
+
+    def cache_info(self):
+        return self._resolve_cached.cache_info()
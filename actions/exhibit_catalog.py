@@ -0,0 +1,252 @@
+"""
+In-memory catalog of the museum's EXHIBIT and HALL nodes.
+
+The knowledge graph is small and changes rarely, so the action server loads it
+once and answers the common hall / collection / showcase / floor questions from
+dictionary indexes instead of going to Neo4j on every message.
+
+A background thread keeps the catalog fresh:
+  - every EXHIBIT_CATALOG_VERSION_CHECK_SECONDS it reads a cheap version marker
+    (the max `version` of any KG_VERSION node plus the EXHIBIT/HALL counts) and
+    reloads when the marker changed, e.g. after a KG reimport;
+  - every EXHIBIT_CATALOG_REFRESH_SECONDS it reloads unconditionally.
+
+A version change also clears the graph result cache.
+
+Until the first load succeeds (or when EXHIBIT_CATALOG_ENABLED=false) every
+lookup returns None and callers fall back to querying Neo4j.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import NamedTuple, Optional, Tuple
+
+from actions import graph_cache
+from actions.cypher import LOAD_EXHIBITS_QUERY, LOAD_HALLS_QUERY, VERSION_MARKER_QUERY
+from actions import graph_backend
+
+logger = logging.getLogger(__name__)
+
+
+class ExhibitRow(NamedTuple):
+    name: str
+    url: Optional[str]
+    hall: Optional[str]
+    collection: Optional[str]
+    showcase: Optional[int]
+    floor: Optional[str]
+
+
+class ExhibitFilters(NamedTuple):
+    """Every hall / collection / showcase / floor a message asks about; an empty tuple means no filter."""
+    halls: Tuple[str, ...] = ()
+    collections: Tuple[str, ...] = ()
+    showcases: Tuple[int, ...] = ()
+    floors: Tuple[str, ...] = ()
+
+    def count(self):
+        return len(self.halls) + len(self.collections) + len(self.showcases) + len(self.floors)
+
+    def matches(self, row):
+        return ((not self.halls or row.hall in self.halls)
+                and (not self.collections or row.collection in self.collections)
+                and (not self.showcases or row.showcase in self.showcases)
+                and (not self.floors or row.floor in self.floors))
+
+
+def _showcase_key(showcase):
+    """Showcases are stored and queried as integers; normalise whatever we get."""
+    try:
+        return int(showcase)
+    except (TypeError, ValueError):
+        return None
+
+
+class _Snapshot:
+    """Immutable set of indexes built from one full load of the graph."""
+
+    def __init__(self, exhibit_rows, hall_rows, version):
+        by_hall = defaultdict(list)
+        by_hall_collection = defaultdict(list)
+        by_collection = defaultdict(list)
+        by_collection_showcase = defaultdict(list)
+        by_floor = defaultdict(list)
+        rows = []
+        rows_by_hall = defaultdict(list)
+        rows_by_collection = defaultdict(list)
+        rows_by_floor = defaultdict(list)
+
+        for row in exhibit_rows:
+            pair = (row["name"], row["url"])
+            hall = row["hall"]
+            collection = row["collection"]
+            showcase = _showcase_key(row["showcase"])
+
+            exhibit = ExhibitRow(row["name"], row["url"], hall, collection, showcase, row["floor"])
+            rows.append(exhibit)
+            rows_by_hall[hall].append(exhibit)
+            rows_by_collection[collection].append(exhibit)
+            rows_by_floor[row["floor"]].append(exhibit)
+
+            if collection is not None and showcase is not None:
+                by_collection_showcase[(collection, showcase)].append(pair)
+
+            # The hall, collection and floor questions only consider exhibits
+            # that are located in a hall, like the original Cypher patterns.
+            if hall is None:
+                continue
+            by_hall[hall].append(pair)
+            if collection is not None:
+                by_hall_collection[(hall, collection)].append(pair)
+                by_collection[collection].append(pair)
+            if row["floor"] is not None:
+                by_floor[row["floor"]].append(pair)
+
+        self.by_hall = {key: tuple(value) for key, value in by_hall.items()}
+        self.by_hall_collection = {key: tuple(value) for key, value in by_hall_collection.items()}
+        self.by_collection = {key: tuple(value) for key, value in by_collection.items()}
+        self.by_collection_showcase = {key: tuple(value) for key, value in by_collection_showcase.items()}
+        self.by_floor = {key: tuple(value) for key, value in by_floor.items()}
+        self.rows = tuple(rows)
+        self.rows_by_hall = {key: tuple(value) for key, value in rows_by_hall.items()}
+        self.rows_by_collection = {key: tuple(value) for key, value in rows_by_collection.items()}
+        self.rows_by_floor = {key: tuple(value) for key, value in rows_by_floor.items()}
+        self.hall_floors = {row["name"]: row["floor"] for row in hall_rows}
+        self.exhibit_count = len(exhibit_rows)
+        self.version = version
+
+
+class ExhibitCatalog:
+
+    def __init__(self, refresh_seconds=3600.0, version_check_seconds=60.0):
+        self.refresh_seconds = refresh_seconds
+        self.version_check_seconds = version_check_seconds
+        self._snapshot = None
+        self._loaded_at = 0.0
+        self._reload_lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    # --------------------------------------------------------------------------
+    # Loading
+    # --------------------------------------------------------------------------
+    def _read_version(self, backend):
+        record = backend.read_records(VERSION_MARKER_QUERY)[0]
+        return (record["version"], record["exhibits"], record["halls"])
+
+    def reload(self):
+        """Load every EXHIBIT and HALL node and swap in fresh indexes."""
+        with self._reload_lock:
+            backend = graph_backend.get_backend()
+            version = self._read_version(backend)
+            exhibit_rows = backend.read_records(LOAD_EXHIBITS_QUERY)
+            hall_rows = backend.read_records(LOAD_HALLS_QUERY)
+
+            self._snapshot = _Snapshot(exhibit_rows, hall_rows, version)
+            self._loaded_at = time.monotonic()
+            logger.info("Exhibit catalog loaded: %d exhibits, %d halls, version marker %s",
+                        self._snapshot.exhibit_count, len(hall_rows), version)
+
+    def refresh_if_stale(self):
+        """Reload when the refresh interval elapsed or the graph version marker changed."""
+        snapshot = self._snapshot
+        if snapshot is None or time.monotonic() - self._loaded_at >= self.refresh_seconds:
+            self.reload()
+            return
+
+        version = self._read_version(graph_backend.get_backend())
+        if version != snapshot.version:
+            logger.info("Graph version marker changed from %s to %s", snapshot.version, version)
+            self.reload()
+            graph_cache.GRAPH_CACHE.clear()
+
+    def _refresh_loop(self):
+        while not self._stop.is_set():
+            try:
+                self.refresh_if_stale()
+            except Exception as e:
+                logger.warning("Exhibit catalog refresh failed: %s", e)
+            self._stop.wait(self.version_check_seconds)
+
+    def start(self):
+        """Load the catalog in the background and keep it fresh."""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._refresh_loop, name="exhibit-catalog", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def is_loaded(self):
+        return self._snapshot is not None
+
+    # --------------------------------------------------------------------------
+    # Lookups: each returns a tuple of (name, url) pairs, or None when the
+    # catalog is not loaded and the caller should query Neo4j instead.
+    # --------------------------------------------------------------------------
+    def hall_exhibits(self, hall, collection=None):
+        snapshot = self._snapshot
+        if snapshot is None:
+            return None
+        if collection is not None:
+            return snapshot.by_hall_collection.get((hall, collection), ())
+        return snapshot.by_hall.get(hall, ())
+
+    def collection_exhibits(self, collection):
+        snapshot = self._snapshot
+        if snapshot is None:
+            return None
+        return snapshot.by_collection.get(collection, ())
+
+    def collection_showcase_exhibits(self, collection, showcase):
+        snapshot = self._snapshot
+        if snapshot is None:
+            return None
+        return snapshot.by_collection_showcase.get((collection, _showcase_key(showcase)), ())
+
+    def floor_exhibits(self, floor):
+        snapshot = self._snapshot
+        if snapshot is None:
+            return None
+        return snapshot.by_floor.get(floor, ())
+
+    def find_exhibits(self, filters):
+        """
+        Every ExhibitRow matching all the given filters, or None if the catalog is not loaded.
+        Starts from the hall, collection or floor index and checks the remaining filters per row.
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            return None
+
+        if filters.halls:
+            rows = [row for hall in filters.halls for row in snapshot.rows_by_hall.get(hall, ())]
+        elif filters.collections:
+            rows = [row for collection in filters.collections
+                    for row in snapshot.rows_by_collection.get(collection, ())]
+        elif filters.floors:
+            rows = [row for floor in filters.floors for row in snapshot.rows_by_floor.get(floor, ())]
+        else:
+            rows = snapshot.rows
+
+        return tuple(row for row in rows if filters.matches(row))
+
+
+def _catalog_enabled():
+    return os.getenv("EXHIBIT_CATALOG_ENABLED", "true").lower() not in ("0", "false", "no")
+
+
+CATALOG = ExhibitCatalog(
+    refresh_seconds=float(os.getenv("EXHIBIT_CATALOG_REFRESH_SECONDS", 3600)),
+    version_check_seconds=float(os.getenv("EXHIBIT_CATALOG_VERSION_CHECK_SECONDS", 60)),
+)
+
+
+def start_catalog():
+    """Start the background load/refresh of the catalog unless it is disabled."""
+    if _catalog_enabled():
+        CATALOG.start()
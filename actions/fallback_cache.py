@@ -0,0 +1,359 @@
+"""
+Persistent cache of the GenAI fallback answers.
+
+Visitors ask the same off-script questions again and again. ActionDefaultFallback
+looks the question up here before calling the GenAI endpoint and stores every
+successful answer, so a repeated question is answered from memory.
+
+  - Key: the normalized question (case, accents, punctuation and spacing removed)
+    plus the prompt version, a hash of the fallback prompts and the chat model
+    (genai_config.prompt_version). When the prompts change, the answers of the
+    old version are dropped (retain_version).
+  - Near duplicates: when there is no exact match, the entry with the same
+    words as the question (in any order) whose character trigrams are most
+    similar (Dice coefficient) to it is used if the similarity reaches
+    FALLBACK_CACHE_SIMILARITY. A single different word changes the question
+    ("open on Monday" / "open on Sunday") while still scoring high, so it is
+    never matched. Short questions only match exactly.
+  - Entries expire after FALLBACK_CACHE_TTL_SECONDS, and past
+    FALLBACK_CACHE_MAX_ENTRIES the least recently used ones are evicted.
+  - The entries are kept in a SQLite file, so they survive restarts. Lookups
+    are served from an in-memory index loaded from it at start, and reloaded
+    when another process (scripts/prewarm-fallbacks) has written to the file.
+    A hit only updates last_hit_at in memory; the hits are written to the file
+    in one transaction every HIT_FLUSH_SECONDS or HIT_FLUSH_ENTRIES hits.
+  - The methods touch the file (reload, writes, fsync), so the action server
+    calls them from a worker thread. A SQLite error (e.g. "database is locked"
+    while the pre-warm job writes) is logged and treated as a cache miss.
+
+Configuration (environment variables):
+    FALLBACK_CACHE_ENABLED          default true
+    FALLBACK_CACHE_PATH             default actions/cache/fallback_answers.sqlite3
+    FALLBACK_CACHE_TTL_SECONDS      default 7 days
+    FALLBACK_CACHE_MAX_ENTRIES      default 5000
+    FALLBACK_CACHE_SIMILARITY       default 0.85
+"""
+
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import defaultdict
+from pathlib import Path
+from typing import NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = str(Path(__file__).resolve().parent / "cache" / "fallback_answers.sqlite3")
+
+# Normalized questions shorter than this are only answered from an exact match
+NEAR_MATCH_MIN_LENGTH = 12
+
+# The last_hit_at of the hits is written to the file at most this often, or after this many hits
+HIT_FLUSH_SECONDS = 60.0
+HIT_FLUSH_ENTRIES = 100
+
+_NON_WORD = re.compile(r"[\W_]+")
+
+
+def normalize_query(text):
+    """Lower case, no accents (τόνοι, διαλυτικά), punctuation and runs of spaces collapsed to one space."""
+    decomposed = unicodedata.normalize("NFKD", text or "")
+    stripped = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return _NON_WORD.sub(" ", stripped.casefold()).strip()
+
+
+def trigrams(normalized):
+    padded = f" {normalized} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def words(normalized):
+    return frozenset(normalized.split())
+
+
+class CachedAnswer(NamedTuple):
+    messages: Tuple[str, ...]
+    query: str              # the question the answer was generated for
+    score: float            # 1.0 for an exact match
+
+
+class _Entry:
+    __slots__ = ("version", "key", "query", "messages", "created_at", "last_hit_at", "grams", "words")
+
+    def __init__(self, version, key, query, messages, created_at, last_hit_at):
+        self.version = version
+        self.key = key
+        self.query = query
+        self.messages = messages
+        self.created_at = created_at
+        self.last_hit_at = last_hit_at
+        self.grams = trigrams(key)
+        self.words = words(key)
+
+
+class FallbackCache:
+
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS answers ("
+        " prompt_version TEXT NOT NULL,"
+        " query_key TEXT NOT NULL,"
+        " query TEXT NOT NULL,"
+        " messages TEXT NOT NULL,"
+        " created_at REAL NOT NULL,"
+        " last_hit_at REAL NOT NULL,"
+        " PRIMARY KEY (prompt_version, query_key))"
+    )
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl_seconds=7 * 24 * 3600, max_entries=5000, min_similarity=0.85):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.min_similarity = min_similarity
+        self._lock = threading.Lock()
+        self._entries = {}                  # (version, key) -> _Entry
+        self._by_gram = defaultdict(set)    # (version, trigram) -> keys, for near-duplicate candidates
+        self._hits = {}                     # (version, key) -> last_hit_at not written to the file yet
+        self._hits_flushed_at = time.monotonic()
+        self._retained_version = None       # the prompt version of the last retain_version()
+
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(self.SCHEMA)
+        self._data_version = None
+        self._load()
+
+    def _load(self):
+        self._flush_hits()
+        now = time.time()
+        self._entries.clear()
+        self._by_gram.clear()
+        self._db.execute("DELETE FROM answers WHERE created_at < ?", (now - self.ttl_seconds,))
+        rows = self._db.execute(
+            "SELECT prompt_version, query_key, query, messages, created_at, last_hit_at FROM answers "
+            "ORDER BY last_hit_at DESC LIMIT ?", (self.max_entries,)).fetchall()
+        for version, key, query, messages, created_at, last_hit_at in rows:
+            self._index(_Entry(version, key, query, tuple(json.loads(messages)), created_at, last_hit_at))
+        self._data_version = self._read_data_version()
+        logger.info("Loaded %d cached fallback answers from %s", len(self._entries), self.path)
+
+    def _read_data_version(self):
+        # Changes whenever another connection commits to the file, never for our own writes
+        return self._db.execute("PRAGMA data_version").fetchone()[0]
+
+    def _reload_if_changed(self):
+        if self._read_data_version() != self._data_version:
+            self._load()
+
+    def _flush_hits(self):
+        """Write the pending last_hit_at updates in one transaction (one fsync)."""
+        if not self._hits:
+            return
+        hits, self._hits = self._hits, {}
+        self._hits_flushed_at = time.monotonic()
+        self._db.execute("BEGIN")
+        try:
+            self._db.executemany(
+                "UPDATE answers SET last_hit_at = ? WHERE prompt_version = ? AND query_key = ?",
+                [(last_hit_at, version, key) for (version, key), last_hit_at in hits.items()])
+            self._db.execute("COMMIT")
+        except sqlite3.Error:
+            self._db.execute("ROLLBACK")
+            raise
+
+    def _index(self, entry):
+        self._entries[(entry.version, entry.key)] = entry
+        for gram in entry.grams:
+            self._by_gram[(entry.version, gram)].add(entry.key)
+
+    def _unindex(self, entry):
+        del self._entries[(entry.version, entry.key)]
+        for gram in entry.grams:
+            keys = self._by_gram.get((entry.version, gram))
+            if keys is not None:
+                keys.discard(entry.key)
+                if not keys:
+                    del self._by_gram[(entry.version, gram)]
+
+    def _drop(self, entry):
+        self._unindex(entry)
+        self._hits.pop((entry.version, entry.key), None)
+        self._db.execute("DELETE FROM answers WHERE prompt_version = ? AND query_key = ?", (entry.version, entry.key))
+
+    def _expired(self, entry, now):
+        return now - entry.created_at > self.ttl_seconds
+
+    def _nearest(self, version, key, now):
+        grams, key_words = trigrams(key), words(key)
+        shared = defaultdict(int)
+        for gram in grams:
+            for candidate in self._by_gram.get((version, gram), ()):
+                shared[candidate] += 1
+
+        best, best_score = None, 0.0
+        for candidate, common in shared.items():
+            entry = self._entries[(version, candidate)]
+            if entry.words != key_words:
+                continue
+            score = 2 * common / (len(grams) + len(entry.grams))  # Dice coefficient
+            if score > best_score and not self._expired(entry, now):
+                best, best_score = entry, score
+        return best, best_score
+
+    def get(self, query, version) -> Optional[CachedAnswer]:
+        """The cached answer to this question or a near duplicate of it, or None (also on a SQLite error)."""
+        key = normalize_query(query)
+        if not key:
+            return None
+
+        try:
+            return self._get(key, version)
+        except sqlite3.Error as e:
+            logger.warning("Fallback answer cache lookup failed, treated as a miss: %s", e)
+            return None
+
+    def _get(self, key, version):
+        now = time.time()
+        with self._lock:
+            self._reload_if_changed()
+            entry = self._entries.get((version, key))
+            if entry is not None and self._expired(entry, now):
+                self._drop(entry)
+                entry = None
+            score = 1.0
+            if entry is None and len(key) >= NEAR_MATCH_MIN_LENGTH:
+                entry, score = self._nearest(version, key, now)
+                if score < self.min_similarity:
+                    entry = None
+            if entry is None:
+                return None
+
+            entry.last_hit_at = now
+            self._hits[(entry.version, entry.key)] = now
+            if (len(self._hits) >= HIT_FLUSH_ENTRIES
+                    or time.monotonic() - self._hits_flushed_at >= HIT_FLUSH_SECONDS):
+                try:
+                    self._flush_hits()
+                except sqlite3.Error as e:
+                    # Only the LRU order is lost; the answer is still served
+                    logger.warning("Fallback answer cache hits not written: %s", e)
+            return CachedAnswer(entry.messages, entry.query, score)
+
+    def contains(self, query, version):
+        """Whether an unexpired answer to exactly this (normalized) question is stored."""
+        with self._lock:
+            self._reload_if_changed()
+            entry = self._entries.get((version, normalize_query(query)))
+            return entry is not None and not self._expired(entry, time.time())
+
+    def put(self, query, version, messages):
+        """Store the answer (a list of message texts) to a question. A SQLite error is logged, not raised."""
+        key = normalize_query(query)
+        messages = tuple(message for message in messages if message)
+        if not key or not messages:
+            return
+
+        try:
+            self._put(key, query, version, messages)
+        except sqlite3.Error as e:
+            logger.warning("Fallback answer not cached: %s", e)
+
+    def _put(self, key, query, version, messages):
+        now = time.time()
+        with self._lock:
+            self._reload_if_changed()
+            previous = self._entries.get((version, key))
+            if previous is not None:
+                self._unindex(previous)
+            self._index(_Entry(version, key, query, messages, now, now))
+            self._db.execute(
+                "INSERT OR REPLACE INTO answers (prompt_version, query_key, query, messages, created_at, last_hit_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (version, key, query, json.dumps(messages, ensure_ascii=False), now, now))
+            self._evict(now)
+
+    def retain_version(self, version):
+        """
+        Drop every answer generated for another prompt version; returns how many were dropped.
+        Nothing to do when `version` is the one retained last. A SQLite error is logged and the
+        drop is tried again on the next call.
+        """
+        if version == self._retained_version:
+            return 0
+
+        try:
+            with self._lock:
+                self._reload_if_changed()
+                self._db.execute("DELETE FROM answers WHERE prompt_version != ?", (version,))
+                stale = [entry for entry in self._entries.values() if entry.version != version]
+                for entry in stale:
+                    self._unindex(entry)
+                self._hits = {hit: last_hit_at for hit, last_hit_at in self._hits.items() if hit[0] == version}
+        except sqlite3.Error as e:
+            logger.warning("Fallback answers of old prompt versions not dropped: %s", e)
+            return 0
+
+        self._retained_version = version
+        if stale:
+            logger.info("Dropped %d cached fallback answers of old prompt versions", len(stale))
+        return len(stale)
+
+    def _evict(self, now):
+        overflow = len(self._entries) - self.max_entries
+        if overflow <= 0:
+            return
+        # Expired entries first, then the least recently used
+        victims = sorted(self._entries.values(), key=lambda entry: (not self._expired(entry, now), entry.last_hit_at))
+        for entry in victims[:overflow]:
+            self._drop(entry)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def close(self):
+        with self._lock:
+            try:
+                self._flush_hits()
+            except sqlite3.Error as e:
+                logger.warning("Fallback answer cache hits not written: %s", e)
+            self._db.close()
+
+
+def _cache_enabled():
+    return os.getenv("FALLBACK_CACHE_ENABLED", "true").lower() not in ("0", "false", "no")
+
+
+_cache = None
+_cache_failed = False
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> Optional[FallbackCache]:
+    """Return the shared cache, opening it on first call; None when it is disabled or cannot be opened."""
+    global _cache, _cache_failed
+
+    if _cache is not None or _cache_failed or not _cache_enabled():
+        return _cache
+
+    with _cache_lock:
+        if _cache is None and not _cache_failed:
+            path = os.getenv("FALLBACK_CACHE_PATH", DEFAULT_CACHE_PATH)
+            try:
+                _cache = FallbackCache(
+                    path,
+                    ttl_seconds=float(os.getenv("FALLBACK_CACHE_TTL_SECONDS", 7 * 24 * 3600)),
+                    max_entries=int(os.getenv("FALLBACK_CACHE_MAX_ENTRIES", 5000)),
+                    min_similarity=float(os.getenv("FALLBACK_CACHE_SIMILARITY", 0.85)),
+                )
+            except (OSError, sqlite3.Error) as e:
+                # Without the cache every fallback goes to the GenAI endpoint, as before
+                logger.warning("Fallback answer cache unavailable (%s): %s", path, e)
+                _cache_failed = True
+
+    return _cache
@@ -0,0 +1,133 @@
+"""
+The GenAI prompt configuration (actions/genai_placeholders.yml), served from memory.
+
+The file is parsed once into an immutable GenAIConfig. get_config() returns the
+current one; at most every GENAI_CONFIG_CHECK_SECONDS it compares the file's
+mtime with the loaded one and, when it changed, parses the file again and
+swaps the whole config in a single assignment. A caller therefore always sees
+the prompts and the model of one version of the file, never a mix, and a prompt
+or model change takes effect without restarting the action server.
+
+A file that fails to parse, or lacks the fallback prompts or models.chat, is
+logged and ignored: the previous config stays in use until the file is fixed.
+
+Configuration (environment variables):
+    GENAI_CONFIG_PATH            default actions/genai_placeholders.yml
+    GENAI_CONFIG_CHECK_SECONDS   default 5
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, NamedTuple, Optional
+
+import yaml
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONFIG_PATH = str(Path(__file__).resolve().parent / "genai_placeholders.yml")
+
+
+def prompt_version(system_prompt, user_prompt, chat_model):
+    """Short hash of everything besides the question that shapes a fallback answer."""
+    digest = hashlib.sha256("\x1f".join((system_prompt or "", user_prompt or "", chat_model or "")).encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+class GenAIConfig(NamedTuple):
+    chat_model: str
+    fallback_system_prompt: str
+    fallback_user_prompt: str           # template with a {query} placeholder
+    fallback_prompt_version: str        # prompt_version() of the three above
+    data: Dict[str, Any]                # the whole parsed file, read-only by convention
+    mtime: float
+
+
+def parse_config(path) -> GenAIConfig:
+    """Parse and check the file; raises ValueError (or OSError / yaml.YAMLError) if it is unusable."""
+    mtime = os.stat(path).st_mtime
+    with open(path, "r", encoding="utf-8") as f:
+        data = yaml.safe_load(f) or {}
+
+    try:
+        chat_model = data["models"]["chat"]
+        prompts = data["tasks"]["fallback_prompts"]
+        system_prompt, user_prompt = prompts["system_prompt"], prompts["user_prompt"]
+    except (KeyError, TypeError) as e:
+        raise ValueError(f"{path}: missing {e}") from None
+    if not chat_model or not system_prompt or not user_prompt:
+        raise ValueError(f"{path}: models.chat and the fallback prompts must be set")
+    if "{query}" not in user_prompt:
+        raise ValueError(f"{path}: fallback_prompts.user_prompt has no {{query}} placeholder")
+
+    return GenAIConfig(chat_model, system_prompt, user_prompt,
+                       prompt_version(system_prompt, user_prompt, chat_model), data, mtime)
+
+
+class GenAIConfigProvider:
+
+    def __init__(self, path=DEFAULT_CONFIG_PATH, check_seconds=5.0):
+        self.path = path
+        self.check_seconds = check_seconds
+        self._lock = threading.Lock()
+        self._config = parse_config(path)  # the action server must not start without prompts
+        self._checked_at = time.monotonic()
+        self._seen_mtime = self._config.mtime
+
+    def get(self) -> GenAIConfig:
+        if time.monotonic() - self._checked_at >= self.check_seconds:
+            self._reload_if_changed()
+        return self._config
+
+    def _reload_if_changed(self):
+        with self._lock:
+            if time.monotonic() - self._checked_at < self.check_seconds:
+                return  # another thread just checked
+            self._checked_at = time.monotonic()
+            try:
+                mtime = os.stat(self.path).st_mtime
+            except OSError as e:
+                logger.warning("GenAI config %s unavailable, keeping the loaded one: %s", self.path, e)
+                return
+            if mtime == self._seen_mtime:
+                return
+            self._seen_mtime = mtime  # a broken file is reported once, not on every check
+
+            try:
+                config = parse_config(self.path)
+            except (OSError, ValueError, yaml.YAMLError) as e:
+                logger.warning("GenAI config %s not reloaded, keeping the loaded one: %s", self.path, e)
+                return
+
+            old, self._config = self._config, config
+            logger.info("Reloaded GenAI config %s (prompt version %s -> %s)",
+                        self.path, old.fallback_prompt_version, config.fallback_prompt_version)
+
+
+_provider: Optional[GenAIConfigProvider] = None
+_provider_lock = threading.Lock()
+
+
+def get_provider() -> GenAIConfigProvider:
+    """Return the shared provider, parsing the file on first call."""
+    global _provider
+
+    if _provider is not None:
+        return _provider
+
+    with _provider_lock:
+        if _provider is None:
+            _provider = GenAIConfigProvider(
+                os.getenv("GENAI_CONFIG_PATH", DEFAULT_CONFIG_PATH),
+                check_seconds=float(os.getenv("GENAI_CONFIG_CHECK_SECONDS", 5)),
+            )
+
+    return _provider
+
+
+def get_config() -> GenAIConfig:
+    """The current prompt configuration."""
+    return get_provider().get()
@@ -0,0 +1,237 @@
+"""
+Pluggable graph backend under the action server's query helpers.
+
+The helpers in actions.py are transaction functions that send the Cypher
+statements of actions/cypher.py; the exhibit catalog reads whole labels with
+the same statements. A backend decides where those statements are executed:
+
+  - Neo4jBackend (default): the shared Neo4j drivers of graph_driver.py;
+  - InMemoryGraphBackend: an in-process property graph loaded from a JSON
+    fixture, which answers the same statements with plain Python. It lets the
+    full action pipeline run in CI and in benchmarks without a database, and
+    without database latency in the measurements.
+
+Configuration (environment variables):
+    GRAPH_BACKEND        "neo4j" (default) or "memory"
+    GRAPH_FIXTURE_PATH   property graph for the memory backend, default actions/fixtures/graph.json
+
+Fixture format: {"nodes": [{"id", "labels", "properties"}], "relationships": [{"type", "start", "end"}]}
+"""
+
+import json
+import logging
+import os
+import random
+import threading
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from pathlib import Path
+
+from actions import cypher
+from actions import graph_driver
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FIXTURE_PATH = str(Path(__file__).resolve().parent / "fixtures" / "graph.json")
+
+# BOOKS_BY_TYPE_QUERY is about this writer only
+KAZANTZAKIS = "Νίκος Καζαντζάκης"
+
+
+class GraphBackend(ABC):
+    """Executes the graph helpers' Cypher statements."""
+
+    @abstractmethod
+    async def execute_read(self, work, *args, **kwargs):
+        """Run an async transaction function (e.g. print_halls) in a read transaction and return its result."""
+
+    @abstractmethod
+    def read_records(self, query, **params):
+        """Run a statement from a background thread and return its records as a list of dicts."""
+
+
+class Neo4jBackend(GraphBackend):
+
+    async def execute_read(self, work, *args, **kwargs):
+        async with graph_driver.get_async_driver().session() as session:
+            return await session.execute_read(work, *args, **kwargs)
+
+    def read_records(self, query, **params):
+        with graph_driver.get_driver().session() as session:
+            return [record.data() for record in session.run(query, **params)]
+
+
+class _InMemoryResult:
+    """Records of one statement; iterable like the Neo4j driver's Result, sync and async."""
+
+    def __init__(self, records):
+        self._records = records
+
+    def __iter__(self):
+        return iter(self._records)
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for record in self._records:
+            yield record
+
+
+class _InMemoryTransaction:
+
+    def __init__(self, backend):
+        self._backend = backend
+
+    async def run(self, query, parameters=None, **kwparameters):
+        params = dict(parameters or {}, **kwparameters)
+        return _InMemoryResult(self._backend.read_records(query, **params))
+
+
+class InMemoryGraphBackend(GraphBackend):
+
+    def __init__(self, fixture_path=DEFAULT_FIXTURE_PATH):
+        with open(fixture_path, "r", encoding="utf-8") as f:
+            graph = json.load(f)
+
+        nodes = {node["id"]: node for node in graph["nodes"]}
+        self._by_label = defaultdict(list)
+        for node in graph["nodes"]:
+            for label in node["labels"]:
+                self._by_label[label].append(node["properties"])
+
+        # The two relationships the queries traverse, as (start properties, end properties) pairs
+        self._located = []  # (exhibit, hall)
+        self._wrote = []    # (writer, book)
+        for relationship in graph["relationships"]:
+            start, end = nodes[relationship["start"]], nodes[relationship["end"]]
+            if relationship["type"] == "ISLOCATEDIN" and "EXHIBIT" in start["labels"] and "HALL" in end["labels"]:
+                self._located.append((start["properties"], end["properties"]))
+            elif relationship["type"] == "WROTE" and "WRITER" in start["labels"]:
+                self._wrote.append((start["properties"], end["properties"]))
+
+        self._halls_of = defaultdict(list)
+        for exhibit, hall in self._located:
+            self._halls_of[id(exhibit)].append(hall)
+
+        # Statement text -> evaluator returning every matching record, before ORDER BY rand() LIMIT
+        self._evaluators = {
+            cypher.BOOKS_BY_TYPE_QUERY: self._books_by_type,
+            cypher.HALL_EXHIBITS_QUERY: self._hall_exhibits,
+            cypher.HALL_COLLECTION_EXHIBITS_QUERY: self._hall_exhibits,
+            cypher.COLLECTION_EXHIBITS_QUERY: self._collection_exhibits,
+            cypher.COLLECTION_SHOWCASE_EXHIBITS_QUERY: self._collection_showcase_exhibits,
+            cypher.FLOOR_EXHIBITS_QUERY: self._floor_exhibits,
+            cypher.LOAD_EXHIBITS_QUERY: self._load_exhibits,
+            cypher.LOAD_HALLS_QUERY: self._load_halls,
+            cypher.VERSION_MARKER_QUERY: self._version_marker,
+        }
+        for query in cypher.filtered_exhibits_queries().values():
+            self._evaluators[query] = self._filtered_exhibits
+
+        logger.info("Loaded in-memory graph from %s: %d exhibits, %d halls",
+                    fixture_path, len(self._by_label["EXHIBIT"]), len(self._by_label["HALL"]))
+
+    async def execute_read(self, work, *args, **kwargs):
+        return await work(_InMemoryTransaction(self), *args, **kwargs)
+
+    def read_records(self, query, **params):
+        evaluator = self._evaluators.get(query)
+        if evaluator is None:
+            raise ValueError(f"Statement not supported by the in-memory graph backend: {query}")
+
+        records = evaluator(**params)
+        if "limit" in params:
+            # ORDER BY rand() LIMIT $limit
+            records = random.sample(records, min(len(records), params["limit"]))
+        return records
+
+    # --------------------------------------------------------------------------
+    # Evaluators, one per statement of actions/cypher.py
+    # --------------------------------------------------------------------------
+    def _books_by_type(self, book_type_pl, **_):
+        names = [book.get("name") for writer, book in self._wrote
+                 if writer.get("name") == KAZANTZAKIS and book.get("type_pl") == book_type_pl]
+        return [{"total": len(names), "name": name} for name in names]
+
+    def _hall_exhibits(self, hall_name, exhibits_collection=None, **_):
+        return [{"name": exhibit.get("name"), "url": exhibit.get("url")}
+                for exhibit, hall in self._located
+                if hall.get("name") == hall_name
+                and (exhibits_collection is None or exhibit.get("collection") == exhibits_collection)]
+
+    def _collection_exhibits(self, exhibits_collection, **_):
+        return [{"name": exhibit.get("name")}
+                for exhibit, hall in self._located if exhibit.get("collection") == exhibits_collection]
+
+    def _collection_showcase_exhibits(self, exhibits_collection, exhibits_showcase, **_):
+        return [{"name": exhibit.get("name"), "url": exhibit.get("url")}
+                for exhibit in self._by_label["EXHIBIT"]
+                if exhibit.get("collection") == exhibits_collection and exhibit.get("showcase") == exhibits_showcase]
+
+    def _floor_exhibits(self, floor, **_):
+        return [{"name": exhibit.get("name"), "url": exhibit.get("url")}
+                for exhibit, hall in self._located if hall.get("floor") == floor]
+
+    def _exhibit_hall_pairs(self):
+        """MATCH (exhibits:EXHIBIT) OPTIONAL MATCH (exhibits)-[:ISLOCATEDIN]->(hall:HALL)"""
+        for exhibit in self._by_label["EXHIBIT"]:
+            for hall in self._halls_of.get(id(exhibit)) or [{}]:
+                yield exhibit, hall
+
+    @staticmethod
+    def _exhibit_record(exhibit, hall):
+        return {"name": exhibit.get("name"), "url": exhibit.get("url"),
+                "collection": exhibit.get("collection"), "showcase": exhibit.get("showcase"),
+                "hall": hall.get("name"), "floor": hall.get("floor")}
+
+    def _filtered_exhibits(self, halls, collections, showcases, floors, **_):
+        # Like the generated Cypher: a hall or floor filter requires a located exhibit
+        pairs = self._located if halls or floors else self._exhibit_hall_pairs()
+        return [self._exhibit_record(exhibit, hall) for exhibit, hall in pairs
+                if (not halls or hall.get("name") in halls)
+                and (not floors or hall.get("floor") in floors)
+                and (not collections or exhibit.get("collection") in collections)
+                and (not showcases or exhibit.get("showcase") in showcases)]
+
+    def _load_exhibits(self, **_):
+        return [self._exhibit_record(exhibit, hall) for exhibit, hall in self._exhibit_hall_pairs()]
+
+    def _load_halls(self, **_):
+        return [{"name": hall.get("name"), "floor": hall.get("floor")} for hall in self._by_label["HALL"]]
+
+    def _version_marker(self, **_):
+        versions = [marker["version"] for marker in self._by_label["KG_VERSION"] if marker.get("version") is not None]
+        return [{"version": max(versions) if versions else None,
+                 "exhibits": len(self._by_label["EXHIBIT"]),
+                 "halls": len(self._by_label["HALL"])}]
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """Return the configured backend, creating it on first call."""
+    global _backend
+
+    if _backend is not None:
+        return _backend
+
+    with _backend_lock:
+        if _backend is None:
+            kind = os.getenv("GRAPH_BACKEND", "neo4j").lower()
+            if kind == "memory":
+                _backend = InMemoryGraphBackend(os.getenv("GRAPH_FIXTURE_PATH", DEFAULT_FIXTURE_PATH))
+            elif kind == "neo4j":
+                _backend = Neo4jBackend()
+            else:
+                raise RuntimeError(f"Unknown GRAPH_BACKEND {kind!r}, expected 'neo4j' or 'memory'")
+
+    return _backend
+
+
+def set_backend(backend):
+    """Replace the backend, e.g. with an InMemoryGraphBackend over a specific fixture in a benchmark."""
+    global _backend
+    _backend = backend
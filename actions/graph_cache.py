@@ -0,0 +1,82 @@
+"""
+Bounded TTL/LRU cache for knowledge-graph query results.
+
+Entries are keyed by query kind and normalised parameters and hold a pool of
+candidate exhibits, so the caller can still draw a fresh random sample on every
+request while Neo4j only sees cache misses.
+
+When the knowledge graph is reimported, bump the `version` of a KG_VERSION
+node: the exhibit catalog checks it every EXHIBIT_CATALOG_VERSION_CHECK_SECONDS,
+reloads and clears this cache. With the catalog disabled there is no such check
+and entries only expire after GRAPH_CACHE_TTL_SECONDS.
+
+Configuration (environment variables):
+    GRAPH_CACHE_SIZE          maximum number of cached queries, default 512 (0 disables the cache)
+    GRAPH_CACHE_TTL_SECONDS   lifetime of an entry, default 600
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from actions.entity_resolver import normalize
+
+
+class TTLCache:
+
+    def __init__(self, maxsize=512, ttl=600.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached value, or None when missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+GRAPH_CACHE = TTLCache(
+    maxsize=int(os.getenv("GRAPH_CACHE_SIZE", 512)),
+    ttl=float(os.getenv("GRAPH_CACHE_TTL_SECONDS", 600)),
+)
+
+
+def _normalize_param(param):
+    if param is None:
+        return None
+    if isinstance(param, (tuple, list)):
+        return tuple(_normalize_param(item) for item in param)  # e.g. the filter lists of a combined query
+    if isinstance(param, int) or str(param).isdigit():
+        return int(param)  # showcase numbers arrive as text from the slots
+    return normalize(param)
+
+
+def make_key(kind, *params):
+    """Cache key from the query kind and its normalised parameters."""
+    return (kind,) + tuple(_normalize_param(param) for param in params)
@@ -0,0 +1,135 @@
+"""
+Process-wide Neo4j drivers shared by every graph helper of the action server.
+
+A driver owns a Bolt connection pool, so creating it once per process and
+reusing it avoids a TCP/TLS handshake and authentication on every visitor
+question. Two drivers are kept, both created lazily on first use (after the
+.env file has been loaded) with the same pool settings:
+  - get_async_driver(): used by the async actions inside the action server's
+    event loop, so concurrent conversations overlap their database waits;
+  - get_driver(): the blocking driver, for background threads (the exhibit
+    catalog refresh) and management scripts.
+Both are closed when the action server process exits.
+
+Configuration (environment variables):
+    NEO4J_URL                              e.g. neo4j://host:7687
+    NEO4J_USERNAME                         default "neo4j"
+    NEO4J_PASSWORD
+    NEO4J_MAX_CONNECTION_POOL_SIZE         default 50
+    NEO4J_CONNECTION_ACQUISITION_TIMEOUT   seconds to wait for a free connection, default 10
+    NEO4J_CONNECTION_TIMEOUT               seconds to open a new connection, default 5
+    NEO4J_LIVENESS_CHECK_TIMEOUT           idle seconds before a pooled connection is pinged, default 30
+    NEO4J_MAX_CONNECTION_LIFETIME          seconds before a connection is recycled, default 3600
+"""
+
+import asyncio
+import atexit
+import logging
+import os
+import threading
+
+from neo4j import AsyncGraphDatabase, GraphDatabase
+
+logger = logging.getLogger(__name__)
+
+_driver = None
+_driver_lock = threading.Lock()
+_async_driver = None
+
+
+def _env_float(name, default):
+    value = os.getenv(name)
+    if value in (None, ""):
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        logger.warning("Invalid value for %s: %r, using %s", name, value, default)
+        return default
+
+
+def driver_config():
+    """Return the keyword arguments passed to GraphDatabase.driver()."""
+    return {
+        "max_connection_pool_size": int(_env_float("NEO4J_MAX_CONNECTION_POOL_SIZE", 50)),
+        "connection_acquisition_timeout": _env_float("NEO4J_CONNECTION_ACQUISITION_TIMEOUT", 10.0),
+        "connection_timeout": _env_float("NEO4J_CONNECTION_TIMEOUT", 5.0),
+        "liveness_check_timeout": _env_float("NEO4J_LIVENESS_CHECK_TIMEOUT", 30.0),
+        "max_connection_lifetime": _env_float("NEO4J_MAX_CONNECTION_LIFETIME", 3600.0),
+    }
+
+
+def _connection_settings():
+    url = os.getenv("NEO4J_URL")
+    username = os.getenv("NEO4J_USERNAME", "neo4j")
+    password = os.getenv("NEO4J_PASSWORD")
+    if not url:
+        raise RuntimeError("NEO4J_URL is not set")
+    return url, (username, password)
+
+
+def get_driver():
+    """Return the shared blocking driver, creating it on first call."""
+    global _driver
+
+    if _driver is not None:
+        return _driver
+
+    with _driver_lock:
+        if _driver is None:
+            url, auth = _connection_settings()
+            _driver = GraphDatabase.driver(url, auth=auth, **driver_config())
+            logger.info("Created shared Neo4j driver for %s", url)
+
+    return _driver
+
+
+def get_async_driver():
+    """
+    Return the shared async driver, creating it on first call.
+    Must be called from the action server's event loop, which the driver's connections are bound to.
+    """
+    global _async_driver
+
+    # No lock needed: the event loop runs this synchronously, one coroutine at a time
+    if _async_driver is None:
+        url, auth = _connection_settings()
+        _async_driver = AsyncGraphDatabase.driver(url, auth=auth, **driver_config())
+        logger.info("Created shared async Neo4j driver for %s", url)
+
+    return _async_driver
+
+
+async def close_async_driver():
+    """Close the shared async driver and its pool. Safe to call more than once."""
+    global _async_driver
+
+    if _async_driver is not None:
+        driver, _async_driver = _async_driver, None
+        await driver.close()
+
+
+def close_driver():
+    """Close the shared driver and its pool. Safe to call more than once."""
+    global _driver
+
+    with _driver_lock:
+        if _driver is not None:
+            try:
+                _driver.close()
+            except Exception as e:
+                logger.warning("Error while closing Neo4j driver: %s", e)
+            _driver = None
+
+
+def _close_drivers_at_exit():
+    close_driver()
+    if _async_driver is not None:
+        # The action server's loop is gone by now; close the pool's sockets from a fresh one
+        try:
+            asyncio.run(close_async_driver())
+        except Exception as e:
+            logger.warning("Error while closing async Neo4j driver: %s", e)
+
+
+atexit.register(_close_drivers_at_exit)
@@ -0,0 +1,238 @@
+"""
+Latency histograms and counters for the custom actions, served in the Prometheus text format.
+
+Every action's run() is wrapped with @timed_action, which records the total
+time per action and outcome. Inside a run, `with phase("graph_query"):` blocks
+add their time to the current action's phases, so one observation per phase
+is recorded when the action ends:
+    entity_resolution   slot values -> canonical hall / collection / floor / showcase
+    graph_query         exhibit catalog, graph result cache or Neo4j
+    llm_request         the GenAI fallback service call
+    response            the rest of the run: slots, messages and carousels
+
+The numbers live in process memory (a lock and a few additions per
+observation) and are exposed on http://<host>:METRICS_PORT/metrics by a daemon
+thread, next to the action webhook on 5055.
+
+Configuration (environment variables):
+    METRICS_ENABLED   default true
+    METRICS_PORT      default 9055
+"""
+
+import contextvars
+import functools
+import inspect
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+# Seconds; tuned for actions that take a few ms from memory and up to tens of seconds on an LLM call
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"') for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class Counter:
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues, amount=1):
+        with self._lock:
+            self._values[labelvalues] += amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for labelvalues, value in values:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labelvalues)} {value}")
+        return lines
+
+
+class Histogram:
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labelvalues -> [per-bucket counts..., +Inf count, sum]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, seconds, *labelvalues):
+        with self._lock:
+            values = self._values.get(labelvalues)
+            if values is None:
+                values = self._values[labelvalues] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    values[i] += 1
+                    break
+            else:
+                values[len(self.buckets)] += 1
+            values[-1] += seconds
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            values = sorted((labelvalues, list(counts)) for labelvalues, counts in self._values.items())
+        for labelvalues, counts in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, labelvalues, [("le", bound)])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, labelvalues)
+            lines.append(f"{self.name}_sum{labels} {counts[-1]}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+ACTION_SECONDS = Histogram("rasa_action_duration_seconds",
+                           "Time spent in a custom action's run().", ("action", "outcome"))
+ACTION_PHASE_SECONDS = Histogram("rasa_action_phase_duration_seconds",
+                                 "Time spent per phase of a custom action.", ("action", "phase"))
+ACTIONS_TOTAL = Counter("rasa_actions_total", "Custom action runs.", ("action", "outcome"))
+GRAPH_LOOKUPS_TOTAL = Counter("rasa_graph_lookups_total",
+                              "Exhibit lookups by where they were answered from.", ("source",))
+LLM_REQUESTS_TOTAL = Counter("rasa_llm_requests_total", "Calls to the GenAI fallback service.", ("outcome",))
+FALLBACK_CACHE_TOTAL = Counter("rasa_fallback_cache_lookups_total",
+                               "Fallback answer cache lookups by result (exact, near, miss).", ("result",))
+
+COALESCED_CALLS_TOTAL = Counter("rasa_coalesced_calls_total",
+                                "Calls that shared an identical call already in flight.", ("call",))
+
+REGISTRY = [ACTION_SECONDS, ACTION_PHASE_SECONDS, ACTIONS_TOTAL, GRAPH_LOOKUPS_TOTAL, LLM_REQUESTS_TOTAL,
+            FALLBACK_CACHE_TOTAL, COALESCED_CALLS_TOTAL]
+
+# Phase -> seconds of the action currently running in this task/thread, or None outside an action
+_current_phases = contextvars.ContextVar("current_phases", default=None)
+
+
+class phase:
+    """Context manager adding the block's duration to a phase of the running action."""
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        phases = _current_phases.get()
+        if phases is not None:
+            phases[self.name] = phases.get(self.name, 0.0) + time.perf_counter() - self._start
+        return False
+
+
+def _record(action_name, phases, started, outcome):
+    elapsed = time.perf_counter() - started
+    for name, seconds in phases.items():
+        ACTION_PHASE_SECONDS.observe(seconds, action_name, name)
+    ACTION_PHASE_SECONDS.observe(max(elapsed - sum(phases.values()), 0.0), action_name, "response")
+    ACTION_SECONDS.observe(elapsed, action_name, outcome)
+    ACTIONS_TOTAL.inc(action_name, outcome)
+
+
+def timed_action(run):
+    """Decorator for Action.run (sync or async) recording its duration, phases and outcome."""
+    if inspect.iscoroutinefunction(run):
+        @functools.wraps(run)
+        async def wrapper(self, *args, **kwargs):
+            phases = {}
+            token = _current_phases.set(phases)
+            started = time.perf_counter()
+            outcome = "error"
+            try:
+                events = await run(self, *args, **kwargs)
+                outcome = "success"
+                return events
+            finally:
+                _current_phases.reset(token)
+                _record(self.name(), phases, started, outcome)
+    else:
+        @functools.wraps(run)
+        def wrapper(self, *args, **kwargs):
+            phases = {}
+            token = _current_phases.set(phases)
+            started = time.perf_counter()
+            outcome = "error"
+            try:
+                events = run(self, *args, **kwargs)
+                outcome = "success"
+                return events
+            finally:
+                _current_phases.reset(token)
+                _record(self.name(), phases, started, outcome)
+
+    return wrapper
+
+
+def render():
+    """Every metric in the Prometheus text exposition format."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # scrapes every few seconds would flood the action server log
+
+
+_server = None
+
+
+def _metrics_enabled():
+    return os.getenv("METRICS_ENABLED", "true").lower() not in ("0", "false", "no")
+
+
+def start_metrics_server():
+    """Serve /metrics from a daemon thread unless disabled. Safe to call more than once."""
+    global _server
+
+    if _server is not None or not _metrics_enabled():
+        return
+
+    port = int(os.getenv("METRICS_PORT", 9055))
+    try:
+        _server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+    except OSError as e:
+        # e.g. a second Sanic worker of the same container; the first one already serves the port
+        logger.warning("Metrics endpoint not started on port %s: %s", port, e)
+        return
+
+    _server.daemon_threads = True
+    threading.Thread(target=_server.serve_forever, name="metrics", daemon=True).start()
+    logger.info("Serving action metrics on :%s/metrics", port)
@@ -0,0 +1,62 @@
+"""
+Coalescing of identical in-flight calls ("single flight").
+
+When a school group taps the same carousel button, dozens of identical graph
+queries or fallback prompts arrive within the same second, all missing the
+caches at once. SingleFlight.do(key, function, ...) runs the coroutine for the
+first caller of a key only; callers that arrive with the same key while it is
+in flight await that same call and share its result, or its exception. Once it
+completes the key is forgotten, so later callers start a new call (and usually
+find its result in the cache that call filled).
+
+The call runs in its own task, so a caller that is cancelled (e.g. the client
+disconnected) does not cancel it for the others. Shared results must be
+treated as read-only.
+
+A SingleFlight belongs to the action server's event loop; the helpers are only
+called from coroutines on that loop, so no lock is needed.
+"""
+
+import asyncio
+
+from actions import metrics
+
+
+class SingleFlight:
+
+    def __init__(self, name):
+        self.name = name  # label of rasa_coalesced_calls_total
+        self._calls = {}  # key -> asyncio.Task of the call in flight
+
+    async def do(self, key, function, *args, **kwargs):
+        """
+        Await function(*args, **kwargs), or the identical call already in flight for this key.
+        Returns (result, shared), where shared is True when the result came from another caller's call.
+        """
+        task = self._calls.get(key)
+        shared = task is not None
+        if shared:
+            metrics.COALESCED_CALLS_TOTAL.inc(self.name)
+        else:
+            task = asyncio.ensure_future(function(*args, **kwargs))
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._forget(key, task))
+
+        return await asyncio.shield(task), shared
+
+    def _forget(self, key, task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Retrieve the exception, so one no caller awaits anymore is not logged as never retrieved
+        if not task.cancelled():
+            task.exception()
+
+    def in_flight(self):
+        return len(self._calls)
+
+
+# Neo4j candidate queries, keyed like the graph result cache
+GRAPH_CALLS = SingleFlight("graph")
+
+# GenAI endpoint requests, keyed by endpoint and request parameters
+GENAI_CALLS = SingleFlight("genai")
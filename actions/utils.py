@@ -1,5 +1,17 @@
-import requests
-# import os
+import asyncio
+import atexit
+import codecs
+import json
+import logging
+import os
+import random
+import threading
+import time
+from typing import List, Optional
+
+import aiohttp
+from actions import metrics
+from actions import single_flight
 # import yaml
 # from dotenv import load_dotenv, set_key
 from rasa_sdk.executor import CollectingDispatcher
@@ -13,13 +25,260 @@ from rasa_sdk.executor import CollectingDispatcher
 # GENAI_BASE_URL = os.getenv("FASTAPI_APP_URL")
 # FALLBACK_ENDPOINT = os.getenv("FALLBACK_ENDPOINT")
 
-def action_openai_chat_completion(
+logger = logging.getLogger(__name__)
+
+APOLOGY_TEXT = "Συγγνώμη, υπήρξε κάποιο πρόβλημα κατά την επεξεργασία του ερωτήματός σου."
+
+# GenAI endpoint client settings (environment variables)
+GENAI_CONNECT_TIMEOUT = float(os.getenv("GENAI_CONNECT_TIMEOUT", 3.05))   # seconds to open a connection
+GENAI_READ_TIMEOUT = float(os.getenv("GENAI_READ_TIMEOUT", 30))           # seconds to wait for the answer
+GENAI_TOTAL_TIMEOUT = float(os.getenv("GENAI_TOTAL_TIMEOUT", 45))         # no retry starts after this many seconds
+GENAI_MAX_RETRIES = int(os.getenv("GENAI_MAX_RETRIES", 2))
+GENAI_BACKOFF_BASE = float(os.getenv("GENAI_BACKOFF_BASE", 0.5))          # first retry waits up to this, then doubles
+GENAI_BACKOFF_MAX = float(os.getenv("GENAI_BACKOFF_MAX", 4))
+GENAI_POOL_SIZE = int(os.getenv("GENAI_POOL_SIZE", 10))
+GENAI_BREAKER_FAILURES = int(os.getenv("GENAI_BREAKER_FAILURES", 5))      # consecutive failed calls that open it
+GENAI_BREAKER_RESET_SECONDS = float(os.getenv("GENAI_BREAKER_RESET_SECONDS", 30))
+# Ask the endpoint for a streamed answer (stream=true) and send it to the visitor as several messages
+GENAI_STREAM = os.getenv("GENAI_STREAM", "false").lower() in ("1", "true", "yes")
+GENAI_CHUNK_CHARS = int(os.getenv("GENAI_CHUNK_CHARS", 400))             # a streamed message ends at a paragraph after this
+
+# Gateway/overload answers worth another try; any other error status is final
+RETRY_STATUSES = (429, 502, 503, 504)
+
+
+class CircuitOpenError(Exception):
+    """The circuit breaker is open: the call was not attempted."""
+
+
+class CircuitBreaker:
+    """
+    Stops calling an unhealthy endpoint.
+    closed: calls go through; `failure_threshold` consecutive failures open the breaker.
+    open: calls fail fast until `reset_timeout` seconds have passed.
+    half-open: one trial call goes through; success closes the breaker, failure opens it again.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                return "half-open"
+            return "open"
+
+    def allow(self):
+        """True if a call may be attempted now."""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_timeout or self._trial_in_flight:
+                return False
+            self._trial_in_flight = True  # only one trial call while half-open
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_flight or self._failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    logger.warning("GenAI circuit breaker opened after %d failed calls", self._failures)
+                self._opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+    def release_trial(self):
+        """The call was abandoned (e.g. cancelled): let the next call be the half-open trial."""
+        with self._lock:
+            self._trial_in_flight = False
+
+
+GENAI_BREAKER = CircuitBreaker(GENAI_BREAKER_FAILURES, GENAI_BREAKER_RESET_SECONDS)
+
+
+def _backoff(attempt):
+    """Full jitter: a random wait up to base * 2^attempt, capped."""
+    return random.uniform(0, min(GENAI_BACKOFF_MAX, GENAI_BACKOFF_BASE * (2 ** attempt)))
+
+
+# ------------------------------------------------------------------------------
+# GenAI client: used by the fallback action inside the action server's event loop, so a slow
+# completion only suspends its own conversation while the graph actions keep being served.
+# ------------------------------------------------------------------------------
+_async_session = None
+
+
+class GenAIHTTPError(Exception):
+    """The GenAI endpoint answered with an error status."""
+
+
+def get_async_session():
+    """
+    Return the shared aiohttp session, creating it on first call.
+    Must be called from the action server's event loop, which its connections are bound to.
+    """
+    global _async_session
+
+    if _async_session is None or _async_session.closed:
+        _async_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=GENAI_POOL_SIZE),
+            timeout=aiohttp.ClientTimeout(total=GENAI_TOTAL_TIMEOUT,
+                                          sock_connect=GENAI_CONNECT_TIMEOUT,
+                                          sock_read=GENAI_READ_TIMEOUT),
+        )
+    return _async_session
+
+
+async def close_async_session():
+    """Close the shared aiohttp session and its pool. Safe to call more than once."""
+    global _async_session
+
+    if _async_session is not None:
+        session, _async_session = _async_session, None
+        await session.close()
+
+
+def _close_async_session_at_exit():
+    if _async_session is not None:
+        # The action server's loop is gone by now; close the pool's sockets from a fresh one
+        try:
+            asyncio.run(close_async_session())
+        except Exception as e:
+            logger.warning("Error while closing the GenAI client session: %s", e)
+
+
+atexit.register(_close_async_session_at_exit)
+
+
+class _ChunkBuffer:
+    """Groups streamed text into messages that end at a paragraph (or sentence) break."""
+
+    def __init__(self, chunk_chars):
+        self.chunk_chars = chunk_chars
+        self.messages = []
+        self._text = ""
+
+    def feed(self, text):
+        self._text += text
+        while len(self._text) >= self.chunk_chars:
+            cut = self._text.rfind("\n\n", self.chunk_chars // 2)
+            if cut == -1:
+                cut = self._text.rfind(". ", self.chunk_chars // 2)
+                cut = cut + 1 if cut != -1 else -1
+            if cut == -1:
+                break  # wait for a natural break instead of cutting a sentence
+            self._flush(self._text[:cut])
+            self._text = self._text[cut:]
+
+    def close(self):
+        self._flush(self._text)
+        self._text = ""
+        return self.messages
+
+    def _flush(self, text):
+        if text.strip():
+            self.messages.append(text.strip())
+
+
+async def _read_streamed_answer(response):
+    """
+    Consume a streamed answer: plain text chunks, or server-sent events whose `data:` lines carry
+    the text. A JSON body (an endpoint without streaming) is read as one message.
+    """
+    if response.content_type == "application/json":
+        return [await response.json(content_type=None)]
+
+    buffer = _ChunkBuffer(GENAI_CHUNK_CHARS)
+    if response.content_type == "text/event-stream":
+        async for line in response.content:
+            line = line.decode("utf-8").rstrip("\r\n")
+            if line.startswith("data:") and line[5:].strip() != "[DONE]":
+                buffer.feed(line[5:].lstrip(" ") or "\n")
+    else:
+        # Streamed bytes may split a multi-byte Greek character
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        async for chunk in response.content.iter_any():
+            buffer.feed(decoder.decode(chunk))
+        buffer.feed(decoder.decode(b"", final=True))
+    return buffer.close()
+
+
+async def async_get_answer_with_retries(endpoint_url, params, stream=False):
+    """
+    Async GET of the endpoint, returning the answer as a list of messages (one unless streamed).
+    Connection errors, timeouts and gateway/overload statuses are retried at most GENAI_MAX_RETRIES
+    times within GENAI_TOTAL_TIMEOUT; a streamed answer is collected fully before it is returned,
+    so a retry never repeats messages the visitor has already seen.
+    """
+    deadline = time.monotonic() + GENAI_TOTAL_TIMEOUT
+    if stream:
+        params = dict(params, stream="true")
+    attempt = 0
+    while True:
+        try:
+            async with get_async_session().get(endpoint_url, params=params) as response:
+                if response.status not in RETRY_STATUSES:
+                    if response.status >= 400:
+                        raise GenAIHTTPError(f"{response.status} from GenAI endpoint")
+                    if stream:
+                        return await _read_streamed_answer(response)
+                    return [await response.json(content_type=None)]
+                error = GenAIHTTPError(f"{response.status} from GenAI endpoint")
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+            error = e
+
+        delay = _backoff(attempt)
+        if attempt >= GENAI_MAX_RETRIES or time.monotonic() + delay >= deadline:
+            raise error
+        attempt += 1
+        logger.info("GenAI request failed (%r), retry %d in %.2fs", error, attempt, delay)
+        await asyncio.sleep(delay)
+
+
+async def async_breaker_call(coroutine_function, *args, **kwargs):
+    """Await the coroutine function through GENAI_BREAKER: CircuitOpenError while it is open."""
+    if not GENAI_BREAKER.allow():
+        raise CircuitOpenError("GenAI endpoint circuit breaker is open")
+    try:
+        result = await coroutine_function(*args, **kwargs)
+    except Exception:
+        GENAI_BREAKER.record_failure()
+        raise
+    except BaseException:
+        # Cancelled, not failed: says nothing about the endpoint's health
+        GENAI_BREAKER.release_trial()
+        raise
+    GENAI_BREAKER.record_success()
+    return result
+
+
+async def async_openai_chat_completion(
     dispatcher: CollectingDispatcher,
     system_prompt: str,
     user_prompt: str,
     chat_model: str,
-    endpoint_url: str
-) -> None:
+    endpoint_url: str,
+    stream: bool = GENAI_STREAM,
+) -> Optional[List[str]]:
+    """
+    Ask the GenAI endpoint and utter its answer, or an apology when it fails or its circuit breaker
+    is open; a streamed answer is uttered as several messages.
+    Returns the uttered answer, or None when the apology was sent instead.
+    """
 
     params = {
         "system_prompt": system_prompt,
@@ -28,10 +287,21 @@ def action_openai_chat_completion(
     }
 
     try:
-        text_response = requests.get(endpoint_url, params=params).json()
-        dispatcher.utter_message(text=text_response)
-    except requests.exceptions.RequestException as e:
-        dispatcher.utter_message(
-            text="Συγγνώμη, υπήρξε κάποιο πρόβλημα κατά την επεξεργασία του ερωτήματός σου."
-        )
-        print(f"API request failed: {e}")
\ No newline at end of file
+        # Visitors asking the identical question at the same time share one request
+        key = (endpoint_url, stream, tuple(sorted(params.items())))
+        with metrics.phase("llm_request"):
+            messages, _ = await single_flight.GENAI_CALLS.do(
+                key, async_breaker_call, async_get_answer_with_retries, endpoint_url, params, stream)
+        metrics.LLM_REQUESTS_TOTAL.inc("success")
+        for text_response in messages:
+            dispatcher.utter_message(text=text_response)
+        return messages
+    except CircuitOpenError as e:
+        metrics.LLM_REQUESTS_TOTAL.inc("short_circuit")
+        dispatcher.utter_message(text=APOLOGY_TEXT)
+        print(f"API request skipped: {e}")
+    except (aiohttp.ClientError, asyncio.TimeoutError, GenAIHTTPError, json.JSONDecodeError) as e:
+        metrics.LLM_REQUESTS_TOTAL.inc("error")
+        dispatcher.utter_message(text=APOLOGY_TEXT)
+        print(f"API request failed: {e!r}")
+    return None
@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+"""
+Action server load benchmark
+
+ - Reads the custom actions from domain.yml, the intent -> action sequences from data/rules.yml and
+   data/stories.yml and the annotated examples ([value](entity)) from data/nlu.yml.
+ - Builds one conversation turn per (rule/story step, example): the tracker carries the example's
+   text, intent and entities, and the slots those entities fill.
+ - Fires the turns (each rule/story turn equally often, with a random example) at the action
+   server's /webhook from --concurrency workers, running the custom
+   actions of a turn in order and carrying their slot events over, like Rasa does
+   (e.g. action_hall_exhibitions, then action_utter_graph_output_hall_exhibitions).
+ - Prints (and optionally writes) a JSON report with throughput, p50/p95/p99 latency and error rate
+   per action, so releases can be compared with the same --seed and --turns.
+ - Exits with status 1 when any action call failed, so a run doubles as a check that every
+   scenario is answered without an action error.
+
+For numbers without database latency, run the action server with GRAPH_BACKEND=memory.
+action_default_fallback calls the GenAI service; leave it out with --exclude action_default_fallback.
+
+Usage:
+    python scripts/benchmark-actions/main.py --url http://localhost:5055/webhook --turns 2000 --concurrency 16
+"""
+
+import argparse
+import json
+import random
+import re
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+import requests
+import yaml
+
+# Get the root directory (assuming your script is in a subfolder)
+ROOT_DIR = Path(__file__).resolve().parent.parent.parent
+
+ENTITY_PATTERN = re.compile(r"\[([^\]]+)\]\((\w+)\)")
+
+# nlu.yml has no examples for the fallback intent: visitor questions the NLU model does not cover
+FALLBACK_TEXTS = [
+    "Ποιο είναι το ωράριο λειτουργίας του μουσείου;",
+    "Πόσο κοστίζει το εισιτήριο;",
+    "Ποια ήταν η σχέση του Καζαντζάκη με τον Σικελιανό;",
+    "Υπάρχει χώρος στάθμευσης κοντά στο μουσείο;",
+    "Τι καιρό θα κάνει αύριο στο Ηράκλειο;",
+]
+
+
+# ------------------------------------------------------------------------------
+# Scenario building
+# ------------------------------------------------------------------------------
+def load_yaml(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return yaml.safe_load(f) or {}
+
+
+def parse_example(example):
+    """Return (text, entities) of an nlu.yml example, with the [value](entity) markup removed."""
+    text = ""
+    entities = []
+    position = 0
+    for match in ENTITY_PATTERN.finditer(example):
+        text += example[position:match.start()]
+        value, entity = match.group(1), match.group(2)
+        entities.append({"entity": entity, "value": value, "start": len(text), "end": len(text) + len(value),
+                         "extractor": "DIETClassifier"})
+        text += value
+        position = match.end()
+    return text + example[position:], entities
+
+
+def intent_examples(nlu_data):
+    examples = defaultdict(list)
+    for item in nlu_data.get("nlu", []):
+        if "intent" not in item:
+            continue
+        for line in str(item.get("examples", "")).splitlines():
+            line = line.strip()
+            if line.startswith("- "):
+                examples[item["intent"]].append(parse_example(line[2:].strip()))
+    return examples
+
+
+def custom_action_turns(custom_actions, *step_lists):
+    """(intent, [custom actions]) for every user turn of the rules/stories that runs a custom action."""
+    turns = set()
+    for steps in step_lists:
+        intent, actions = None, []
+        for step in steps + [{"intent": None}]:
+            if "intent" in step:
+                if intent is not None and actions:
+                    turns.add((intent, tuple(actions)))
+                intent, actions = step["intent"], []
+            elif step.get("action") in custom_actions:
+                actions.append(step["action"])
+    return sorted(turns)
+
+
+def slot_entities(domain):
+    """entity -> slots filled from it (from_entity mappings of domain.yml)."""
+    mapping = defaultdict(list)
+    for slot, definition in (domain.get("slots") or {}).items():
+        for slot_mapping in definition.get("mappings", []):
+            if slot_mapping.get("type") == "from_entity":
+                mapping[slot_mapping["entity"]].append(slot)
+    return mapping
+
+
+def build_scenarios(domain, nlu_data, rules, stories):
+    custom_actions = {action for action in domain.get("actions", []) if action.startswith("action_")}
+    examples = intent_examples(nlu_data)
+    entity_slots = slot_entities(domain)
+    empty_slots = {slot: None for slot in (domain.get("slots") or {})}
+
+    step_lists = [rule.get("steps", []) for rule in rules.get("rules", [])]
+    step_lists += [story.get("steps", []) for story in stories.get("stories", [])]
+
+    scenarios = []
+    for intent, actions in custom_action_turns(custom_actions, *step_lists):
+        if intent == "nlu_fallback":
+            turn_examples = [(text, []) for text in FALLBACK_TEXTS]
+        elif intent.startswith("EXTERNAL_"):
+            turn_examples = [(f"EXTERNAL: {intent}", [])]
+        else:
+            turn_examples = examples.get(intent) or [("", [])]
+
+        for text, entities in turn_examples:
+            slots = dict(empty_slots)
+            for entity in entities:
+                for slot in entity_slots.get(entity["entity"], []):
+                    slots[slot] = entity["value"]
+            scenarios.append({
+                "intent": intent,
+                "actions": list(actions),
+                "latest_message": {
+                    "text": text,
+                    "intent": {"name": intent, "confidence": 1.0},
+                    "entities": entities,
+                },
+                "slots": slots,
+            })
+
+    return scenarios, sorted(custom_actions)
+
+
+# ------------------------------------------------------------------------------
+# Load generation
+# ------------------------------------------------------------------------------
+def webhook_payload(action, sender_id, scenario, slots, domain):
+    return {
+        "next_action": action,
+        "sender_id": sender_id,
+        "tracker": {
+            "sender_id": sender_id,
+            "slots": slots,
+            "latest_message": scenario["latest_message"],
+            "latest_event_time": time.time(),
+            "followup_action": None,
+            "paused": False,
+            "events": [],
+            "latest_input_channel": "rest",
+            "active_loop": {},
+            "latest_action": {"action_name": "action_listen"},
+            "latest_action_name": "action_listen",
+        },
+        "domain": domain,
+        "version": "3.6.2",
+    }
+
+
+def apply_events(slots, events):
+    """Carry slot events over to the next action of the turn, like the Rasa tracker does."""
+    for event in events:
+        if event.get("event") == "slot":
+            slots[event["name"]] = event.get("value")
+        elif event.get("event") == "reset_slots":
+            for slot in slots:
+                slots[slot] = None
+
+
+class Recorder:
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.error_samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, action, seconds, error=None):
+        with self._lock:
+            self.latencies[action].append(seconds)
+            if error is not None:
+                self.errors[action] += 1
+                self.error_samples.setdefault(action, error)
+
+
+_thread_local = threading.local()
+
+
+def _session():
+    # One pooled keep-alive connection per worker thread, like a Rasa server's HTTP client
+    if not hasattr(_thread_local, "session"):
+        _thread_local.session = requests.Session()
+    return _thread_local.session
+
+
+def run_turn(url, turn_id, scenario, domain, timeout, recorder):
+    sender_id = f"benchmark-{turn_id}"
+    slots = dict(scenario["slots"])
+
+    for action in scenario["actions"]:
+        payload = webhook_payload(action, sender_id, scenario, slots, domain)
+        started = time.perf_counter()
+        error = None
+        try:
+            response = _session().post(url, json=payload, timeout=timeout)
+            if response.status_code != 200:
+                error = f"HTTP {response.status_code}: {response.text[:200]}"
+            else:
+                apply_events(slots, response.json().get("events", []))
+        except (requests.exceptions.RequestException, ValueError) as e:
+            error = str(e)
+        if recorder is not None:
+            recorder.record(action, time.perf_counter() - started, error)
+        if error is not None:
+            break  # Rasa would not run the rest of the turn either
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return None
+    rank = max(int(round(fraction * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def summarize(latencies, errors, duration):
+    values = sorted(latencies)
+    count = len(values)
+
+    def ms(seconds):
+        return round(seconds * 1000, 3) if seconds is not None else None
+
+    return {
+        "requests": count,
+        "errors": errors,
+        "error_rate": round(errors / count, 4) if count else 0.0,
+        "throughput_rps": round(count / duration, 2) if duration else 0.0,
+        "latency_ms": {
+            "p50": ms(percentile(values, 0.50)),
+            "p95": ms(percentile(values, 0.95)),
+            "p99": ms(percentile(values, 0.99)),
+            "mean": ms(sum(values) / count) if count else None,
+            "max": ms(values[-1]) if values else None,
+        },
+    }
+
+
+def registered_actions(url, timeout):
+    """Names the action server has registered (GET /actions), or None if it cannot tell."""
+    try:
+        response = requests.get(url.rsplit("/", 1)[0] + "/actions", timeout=timeout)
+        response.raise_for_status()
+        return {action["name"] for action in response.json()}
+    except (requests.exceptions.RequestException, ValueError, KeyError, TypeError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the Rasa action server and report latency per action.")
+    parser.add_argument("--url", default="http://localhost:5055/webhook", help="action server webhook URL")
+    parser.add_argument("--turns", type=int, default=1000, help="conversation turns to fire (default 1000)")
+    parser.add_argument("--warmup", type=int, default=50, help="unmeasured turns fired first (default 50)")
+    parser.add_argument("--concurrency", type=int, default=8, help="parallel conversations (default 8)")
+    parser.add_argument("--timeout", type=float, default=30.0, help="per-request timeout in seconds")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the turn order, for repeatable runs")
+    parser.add_argument("--actions", default="", help="comma-separated actions to benchmark (default all)")
+    parser.add_argument("--exclude", default="", help="comma-separated actions to leave out")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    parser.add_argument("--allow-errors", action="store_true",
+                        help="exit with status 0 even when action calls failed")
+    args = parser.parse_args()
+
+    domain = load_yaml(ROOT_DIR / "domain.yml")
+    scenarios, domain_actions = build_scenarios(
+        domain,
+        load_yaml(ROOT_DIR / "data" / "nlu.yml"),
+        load_yaml(ROOT_DIR / "data" / "rules.yml"),
+        load_yaml(ROOT_DIR / "data" / "stories.yml"),
+    )
+
+    available = registered_actions(args.url, args.timeout)
+    excluded = {name for name in args.exclude.split(",") if name}
+    if available is not None:
+        excluded |= set(domain_actions) - available
+    selected = {name for name in args.actions.split(",") if name} or set(domain_actions)
+    selected -= excluded
+
+    for scenario in scenarios:
+        scenario["actions"] = [action for action in scenario["actions"] if action in selected]
+    scenarios = [scenario for scenario in scenarios if scenario["actions"]]
+    if not scenarios:
+        parser.error("no scenario runs any of the selected actions")
+
+    # Every turn type gets the same share, however many nlu examples its intent has
+    turn_types = defaultdict(list)
+    for scenario in scenarios:
+        turn_types[(scenario["intent"], tuple(scenario["actions"]))].append(scenario)
+    turn_types = [turn_types[key] for key in sorted(turn_types)]
+
+    rng = random.Random(args.seed)
+    plan = [rng.choice(rng.choice(turn_types)) for _ in range(args.warmup + args.turns)]
+
+    started_at = datetime.now(timezone.utc).isoformat()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(lambda item: run_turn(args.url, item[0], item[1], domain, args.timeout, None),
+                      enumerate(plan[:args.warmup])))
+
+        recorder = Recorder()
+        started = time.perf_counter()
+        list(pool.map(lambda item: run_turn(args.url, item[0], item[1], domain, args.timeout, recorder),
+                      enumerate(plan[args.warmup:], start=args.warmup)))
+        duration = time.perf_counter() - started
+
+    all_latencies = [seconds for values in recorder.latencies.values() for seconds in values]
+    report = {
+        "url": args.url,
+        "started_at": started_at,
+        "turns": args.turns,
+        "warmup_turns": args.warmup,
+        "concurrency": args.concurrency,
+        "seed": args.seed,
+        "duration_seconds": round(duration, 3),
+        "overall": summarize(all_latencies, sum(recorder.errors.values()), duration),
+        "actions": {action: summarize(recorder.latencies[action], recorder.errors[action], duration)
+                    for action in sorted(recorder.latencies)},
+        "not_benchmarked": sorted(set(domain_actions) - set(recorder.latencies)),
+        "error_samples": recorder.error_samples,
+    }
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    print(output)
+
+    errors = report["overall"]["errors"]
+    if errors and not args.allow_errors:
+        for action, sample in sorted(recorder.error_samples.items()):
+            print(f"{action}: {recorder.errors[action]} errors, e.g. {sample}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
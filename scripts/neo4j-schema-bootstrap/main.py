@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Neo4j schema bootstrap with index verification
+
+ - Creates the indexes and constraints the action server's queries rely on (actions/cypher.py,
+   SCHEMA_STATEMENTS). Every statement is IF NOT EXISTS, so the script can run on every deploy.
+ - Waits for the indexes to come online.
+ - Runs EXPLAIN on every point query of the action server, including each shape the combined
+   filter query can take, and fails (exit code 1) if any plan still starts from a label scan
+   or an all-nodes scan. The catalog's full-load queries scan on purpose and are only reported.
+
+Run it after a KG import or a change to actions/cypher.py:
+    python scripts/neo4j-schema-bootstrap/main.py
+    python scripts/neo4j-schema-bootstrap/main.py --verify-only
+"""
+
+import argparse
+import logging
+import sys
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+# Get the root directory (assuming your script is in a subfolder)
+ROOT_DIR = Path(__file__).resolve().parent.parent.parent
+
+# Load the .env file from the root directory
+load_dotenv(ROOT_DIR / ".env")
+
+# The queries and the driver settings are shared with the action server
+sys.path.insert(0, str(ROOT_DIR))
+from actions import cypher  # noqa: E402
+from actions import graph_driver  # noqa: E402
+
+# ------------------------------------------------------------------------------
+# Logging Setup: this is run by hand or from a deploy step, so log to stdout
+# ------------------------------------------------------------------------------
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s [%(levelname)s] %(message)s'
+)
+
+# Plan operators that read every node of a label (or of the whole graph)
+SCAN_OPERATORS = (
+    "AllNodesScan",
+    "NodeByLabelScan",
+    "UnionNodeByLabelsScan",
+    "IntersectionNodeByLabelsScan",
+)
+
+# Example values for the IN $list predicates of the combined filter query
+FILTER_SAMPLES = {
+    "halls": ["Θέατρο", "Οδύσσεια"],
+    "collections": ["Θέατρο"],
+    "showcases": [1, 2],
+    "floors": ["1ος"],
+}
+
+
+def create_schema(session):
+    for statement in cypher.SCHEMA_STATEMENTS:
+        logging.info("Applying: %s", statement)
+        session.run(statement).consume()
+
+
+def await_indexes(session, timeout_seconds):
+    logging.info("Waiting up to %s seconds for the indexes to come online", timeout_seconds)
+    session.run("CALL db.awaitIndexes($timeout)", timeout=timeout_seconds).consume()
+
+
+def filtered_query_shapes():
+    """Every query build_filtered_exhibits_query() can produce for a compound question."""
+    for chosen, query in cypher.filtered_exhibits_queries().items():
+        if not chosen:
+            continue  # never sent: a compound question has at least one filter
+        params = {kind: FILTER_SAMPLES[kind] if kind in chosen else [] for kind in cypher.FILTER_KINDS}
+        yield "FILTERED_EXHIBITS_QUERY[" + "+".join(chosen) + "]", query, params
+
+
+def queries_to_verify():
+    for name, (query, params) in cypher.INDEXED_QUERIES.items():
+        yield name, query, params
+    yield from filtered_query_shapes()
+
+
+def plan_operators(plan):
+    """Flatten an EXPLAIN plan into its operator names, without the runtime suffix (e.g. "@neo4j")."""
+    operators = [plan["operatorType"].split("@")[0]]
+    for child in plan.get("children", []):
+        operators.extend(plan_operators(child))
+    return operators
+
+
+def explain(session, query, params):
+    summary = session.run("EXPLAIN " + query, limit=5, **params).consume()
+    return plan_operators(summary.plan)
+
+
+def verify_queries(session):
+    """EXPLAIN every query and return the names of those whose plan scans a label."""
+    failures = []
+
+    for name, query, params in queries_to_verify():
+        operators = explain(session, query, params)
+        scans = [operator for operator in operators if operator in SCAN_OPERATORS]
+        if scans:
+            logging.error("%s falls back to %s. Plan: %s", name, ", ".join(scans), " <- ".join(operators))
+            failures.append(name)
+        else:
+            logging.info("%s OK: %s", name, " <- ".join(operators))
+
+    for name, query in cypher.FULL_SCAN_QUERIES.items():
+        operators = explain(session, query, {})
+        logging.info("%s (full load, scan expected): %s", name, " <- ".join(operators))
+
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create the Neo4j indexes and verify the query plans.")
+    parser.add_argument("--verify-only", action="store_true",
+                        help="only EXPLAIN the queries, do not create indexes or constraints")
+    parser.add_argument("--index-timeout", type=int, default=300,
+                        help="seconds to wait for new indexes to come online (default 300)")
+    args = parser.parse_args()
+
+    driver = graph_driver.get_driver()
+    try:
+        with driver.session() as session:
+            if not args.verify_only:
+                create_schema(session)
+                await_indexes(session, args.index_timeout)
+            failures = verify_queries(session)
+    finally:
+        graph_driver.close_driver()
+
+    if failures:
+        logging.error("%d queries are not served by an index: %s", len(failures), ", ".join(failures))
+        sys.exit(1)
+
+    logging.info("Every action server query is served by an index")
+
+
+if __name__ == "__main__":
+    main()
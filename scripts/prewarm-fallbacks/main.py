@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Pre-warm the GenAI fallback answer cache from the unrecognized-message history
+
+ - Reads the text of every user event classified as 'nlu_fallback' in the last --days days from
+   the tracker store's events table (the same events scripts/gid0008 reports hourly).
+ - Groups the texts by their normalized form and merges near duplicates with the cache's own
+   trigram similarity, then ranks the groups by how many times visitors asked them.
+ - For the --top most frequent questions that have no cached answer for the current fallback
+   prompts yet, asks the GenAI endpoint, at most --rate requests per minute, and stores each
+   answer in the action server's fallback answer cache (actions/fallback_cache.py).
+
+Run it off-peak, e.g. nightly from cron, so that at opening time the most common unknown
+questions are answered from the cache:
+    python scripts/prewarm-fallbacks/main.py --top 200 --rate 20
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import psycopg2
+import requests
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Get the root directory (assuming your script is in a subfolder)
+ROOT_DIR = Path(__file__).resolve().parent.parent.parent
+
+# Load the .env file from the root directory
+load_dotenv(ROOT_DIR / ".env")
+
+# The cache, its key normalization and the prompt configuration are shared with the action server
+sys.path.insert(0, str(ROOT_DIR))
+from actions import fallback_cache  # noqa: E402
+from actions import genai_config  # noqa: E402
+
+# ------------------------------------------------------------------------------
+# Logging Setup: run by cron or by hand, so log to stdout
+# ------------------------------------------------------------------------------
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s [%(levelname)s] %(message)s'
+)
+
+GENAI_BASE_URL = os.getenv("FASTAPI_APP_URL")
+OPENAI_RESPONSE_ENDPOINT = os.getenv("OPENAI_RESPONSE_ENDPOINT")
+
+# Messages outside these lengths are typos or pasted text, not questions worth an answer
+MIN_QUESTION_LENGTH = 4
+MAX_QUESTION_LENGTH = 500
+
+
+# ------------------------------------------------------------------------------
+# DB Credentials (as in scripts/gid0008)
+# ------------------------------------------------------------------------------
+def load_db_credentials():
+    db_host = os.getenv('DB_HOST')
+    db_name = os.getenv('DB_DATABASE')
+    db_user = os.getenv('DB_USERNAME')
+    db_password = os.getenv('DB_PASSWORD')
+    db_port = int(os.getenv('DB_PORT', 5432))
+
+    return db_host, db_name, db_user, db_password, db_port
+
+
+# ------------------------------------------------------------------------------
+# Mining
+# ------------------------------------------------------------------------------
+def query_fallback_texts(db_creds, since_dt):
+    """
+    Every distinct nlu_fallback message text since since_dt with its number of occurrences.
+    The counting is done by PostgreSQL, so only the distinct texts are transferred.
+    """
+    db_host, db_name, db_user, db_password, db_port = db_creds
+    conn = psycopg2.connect(
+        host=db_host,
+        database=db_name,
+        user=db_user,
+        password=db_password,
+        port=db_port
+    )
+    try:
+        cursor = conn.cursor()
+        query = """
+        SELECT data::json->>'text' AS text, COUNT(*) AS occurrences
+        FROM events
+        WHERE type_name = 'user'
+          AND data::json->'parse_data'->'intent'->>'name' = 'nlu_fallback'
+          AND (data::json->>'timestamp')::double precision >= %s
+        GROUP BY 1
+        """
+        cursor.execute(query, (since_dt.timestamp(),))
+        rows = cursor.fetchall()
+    finally:
+        conn.close()
+
+    logging.info("Found %d distinct fallback texts since %s", len(rows), since_dt.isoformat())
+    return rows
+
+
+class QuestionGroup:
+    """Texts that the cache treats as the same question, represented by the most frequent one."""
+
+    def __init__(self, key, text, occurrences):
+        self.key = key
+        self.grams = fallback_cache.trigrams(key)
+        self.words = fallback_cache.words(key)
+        self.variants = {text: occurrences}
+        self.occurrences = occurrences
+
+    @property
+    def text(self):
+        return max(self.variants, key=self.variants.get)
+
+    def add(self, text, occurrences):
+        self.variants[text] = self.variants.get(text, 0) + occurrences
+        self.occurrences += occurrences
+
+
+def rank_questions(rows, min_similarity):
+    """
+    Group the texts by normalized form, merge near duplicates into the most frequent group they
+    resemble, and return the groups, most asked first.
+    """
+    by_key = {}
+    for text, occurrences in rows:
+        text = (text or "").strip()
+        key = fallback_cache.normalize_query(text)
+        if not MIN_QUESTION_LENGTH <= len(key) <= MAX_QUESTION_LENGTH:
+            continue
+        if key in by_key:
+            by_key[key].add(text, occurrences)
+        else:
+            by_key[key] = QuestionGroup(key, text, occurrences)
+
+    groups = []
+    for group in sorted(by_key.values(), key=lambda g: g.occurrences, reverse=True):
+        target = None
+        if len(group.key) >= fallback_cache.NEAR_MATCH_MIN_LENGTH:
+            for candidate in groups:
+                if len(candidate.key) < fallback_cache.NEAR_MATCH_MIN_LENGTH or candidate.words != group.words:
+                    continue
+                score = 2 * len(group.grams & candidate.grams) / (len(group.grams) + len(candidate.grams))
+                if score >= min_similarity:
+                    target = candidate
+                    break
+        if target is None:
+            groups.append(group)
+        else:
+            for text, occurrences in group.variants.items():
+                target.add(text, occurrences)
+
+    groups.sort(key=lambda g: g.occurrences, reverse=True)
+    return groups
+
+
+# ------------------------------------------------------------------------------
+# GenAI endpoint
+# ------------------------------------------------------------------------------
+def create_session():
+    session = requests.Session()
+    retries = Retry(total=3, backoff_factor=2, status_forcelist=(429, 502, 503, 504),
+                    allowed_methods=("GET",), respect_retry_after_header=True)
+    session.mount("http://", HTTPAdapter(max_retries=retries))
+    session.mount("https://", HTTPAdapter(max_retries=retries))
+    return session
+
+
+def generate_answer(session, question, config, timeout):
+    params = {
+        "system_prompt": config.fallback_system_prompt,
+        "user_prompt": config.fallback_user_prompt.format(query=question),
+        "chat_model": config.chat_model,
+    }
+    response = session.get(f"{GENAI_BASE_URL}/{OPENAI_RESPONSE_ENDPOINT}", params=params, timeout=timeout)
+    response.raise_for_status()
+    return response.json()
+
+
+# ------------------------------------------------------------------------------
+# Main
+# ------------------------------------------------------------------------------
+def prewarm(args):
+    config = genai_config.get_config()
+    version = config.fallback_prompt_version
+
+    since_dt = datetime.now(timezone.utc) - timedelta(days=args.days)
+    rows = query_fallback_texts(load_db_credentials(), since_dt)
+    groups = [group for group in rank_questions(rows, args.similarity) if group.occurrences >= args.min_count]
+    logging.info("%d distinct questions asked at least %d times", len(groups), args.min_count)
+
+    cache = fallback_cache.FallbackCache(
+        os.getenv("FALLBACK_CACHE_PATH", fallback_cache.DEFAULT_CACHE_PATH),
+        ttl_seconds=float(os.getenv("FALLBACK_CACHE_TTL_SECONDS", 7 * 24 * 3600)),
+        max_entries=int(os.getenv("FALLBACK_CACHE_MAX_ENTRIES", 5000)),
+    )
+    session = create_session()
+    interval = 60.0 / args.rate
+    generated = skipped = failed = 0
+    next_request_at = time.monotonic()
+
+    try:
+        for rank, group in enumerate(groups[:args.top], start=1):
+            question = group.text
+            if not args.refresh and cache.contains(question, version):
+                skipped += 1
+                continue
+            if args.dry_run:
+                print(f"{rank:4d}. ({group.occurrences}x) {question}")
+                continue
+
+            # Rate limit: at most args.rate requests per minute
+            time.sleep(max(0.0, next_request_at - time.monotonic()))
+            next_request_at = time.monotonic() + interval
+            try:
+                answer = generate_answer(session, question, config, args.timeout)
+            except (requests.RequestException, ValueError) as e:
+                failed += 1
+                logging.error("No answer for %r: %s", question, e)
+                if failed >= args.max_failures:
+                    logging.error("%d failed requests, stopping", failed)
+                    break
+                continue
+
+            # Every variant the visitors typed maps to the same answer
+            for text in group.variants:
+                cache.put(text, version, [answer])
+            generated += 1
+            logging.info("%d. (%dx) cached answer for %r", rank, group.occurrences, question)
+    finally:
+        cache.close()
+
+    logging.info("Pre-warm done: %d answers generated, %d already cached, %d failed", generated, skipped, failed)
+    return failed == 0 or generated > 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute GenAI answers to the most frequent fallback questions.")
+    parser.add_argument("--top", type=int, default=100, help="number of most frequent questions to answer (default 100)")
+    parser.add_argument("--days", type=int, default=30, help="history to mine, in days (default 30)")
+    parser.add_argument("--min-count", type=int, default=2, help="skip questions asked fewer times (default 2)")
+    parser.add_argument("--rate", type=float, default=20, help="GenAI requests per minute (default 20)")
+    parser.add_argument("--timeout", type=float, default=60, help="seconds to wait for one answer (default 60)")
+    parser.add_argument("--similarity", type=float,
+                        default=float(os.getenv("FALLBACK_CACHE_SIMILARITY", 0.85)),
+                        help="trigram similarity at which two questions are merged (default FALLBACK_CACHE_SIMILARITY)")
+    parser.add_argument("--max-failures", type=int, default=5, help="stop after this many failed requests (default 5)")
+    parser.add_argument("--refresh", action="store_true", help="regenerate answers that are already cached")
+    parser.add_argument("--dry-run", action="store_true", help="only print the questions that would be answered")
+    args = parser.parse_args()
+
+    if not args.dry_run and not (GENAI_BASE_URL and OPENAI_RESPONSE_ENDPOINT):
+        parser.error("FASTAPI_APP_URL and OPENAI_RESPONSE_ENDPOINT must be set")
+
+    if not prewarm(args):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
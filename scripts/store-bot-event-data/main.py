@@ -83,12 +83,21 @@ Content-Type: application/json
 '''
 
 import psycopg2
+import argparse
+import fcntl
+import gzip
 import json
 import requests
 from dotenv import load_dotenv
 import os
 import yaml
 import logging
+import select
+import signal
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from pathlib import Path
 
 
@@ -147,6 +156,55 @@ logging.info(f"Endpoints data loaded. Using DB: {db_name}")
 POST_URL = os.getenv("BOT_EVENT_DATA_POST_URL")
 LAST_ID_ENDPOINT = os.getenv("BOT_EVENT_DATA_LAST_ID_ENDPOINT")
 
+HEADERS = {
+    'Content-Type': 'application/json',
+    'assistant-botid': 'exhibition-bot-kazantzakis'
+}
+
+# (connect, read) timeout of every request: a hung request would otherwise hold the export lock,
+# and every later run would exit without exporting
+HTTP_TIMEOUT = (float(os.getenv("BOT_EVENT_DATA_CONNECT_TIMEOUT_SECONDS", 10)),
+                float(os.getenv("BOT_EVENT_DATA_READ_TIMEOUT_SECONDS", 120)))
+
+# ------------------------------------------------------------------------------
+# Export settings
+# ------------------------------------------------------------------------------
+# Events per POST to start with. The rows are streamed from a server-side cursor, so only the
+# chunks being uploaded are held in memory however large the backlog is.
+CHUNK_SIZE = int(os.getenv("BOT_EVENT_DATA_CHUNK_SIZE", 500))
+# The chunk size adapts within these bounds: it grows while POSTs answer well within the target
+# latency, shrinks when they take longer, and is halved on 429/5xx responses.
+CHUNK_MIN = int(os.getenv("BOT_EVENT_DATA_CHUNK_MIN", 50))
+CHUNK_MAX = int(os.getenv("BOT_EVENT_DATA_CHUNK_MAX", 5000))
+TARGET_LATENCY_SECONDS = float(os.getenv("BOT_EVENT_DATA_TARGET_LATENCY_SECONDS", 2))
+# Chunks uploaded at the same time, and attempts per chunk on 429/5xx or connection errors
+UPLOAD_CONCURRENCY = max(1, int(os.getenv("BOT_EVENT_DATA_UPLOAD_CONCURRENCY", 4)))
+UPLOAD_ATTEMPTS = max(1, int(os.getenv("BOT_EVENT_DATA_UPLOAD_ATTEMPTS", 3)))
+# Longest wait for the transactions inserting into events to end before an export (see settled_event_id)
+SETTLE_TIMEOUT_SECONDS = float(os.getenv("BOT_EVENT_DATA_SETTLE_TIMEOUT_SECONDS", 30))
+# The spool is cleared once every chunk written to it is acknowledged; at the latest after this
+# many chunks the uploads are drained so that it can be
+SPOOL_MAX_CHUNKS = int(os.getenv("BOT_EVENT_DATA_SPOOL_MAX_CHUNKS", 32))
+# Hours between two checks of the local watermark against the service's last event id
+RECONCILE_HOURS = float(os.getenv("BOT_EVENT_DATA_RECONCILE_HOURS", 24))
+# Passthrough: embed the stored events.data JSON text in the POST body as is, without parsing it
+PASSTHROUGH = os.getenv("BOT_EVENT_DATA_PASSTHROUGH", "false").lower() in ("1", "true", "yes")
+# Check of the stored JSON in passthrough mode: "cheap" (default), "full" (json.loads) or "none"
+VALIDATE = os.getenv("BOT_EVENT_DATA_VALIDATE", "cheap").lower()
+# gzip the POST body (Content-Encoding: gzip); on by default in passthrough mode
+GZIP_BODY = os.getenv("BOT_EVENT_DATA_GZIP", str(PASSTHROUGH)).lower() in ("1", "true", "yes")
+# Compress the crash-recovery spool
+SPOOL_GZIP = os.getenv("BOT_EVENT_DATA_SPOOL_GZIP", "false").lower() in ("1", "true", "yes")
+
+# Daemon mode (--daemon): a micro-batch is exported once this many inserts were notified, or once
+# the oldest notified insert is this many seconds old; the table is polled in case a notification
+# is missed (or the trigger could not be installed).
+BATCH_MAX_EVENTS = int(os.getenv("BOT_EVENT_DATA_BATCH_MAX_EVENTS", 50))
+BATCH_MAX_AGE_SECONDS = float(os.getenv("BOT_EVENT_DATA_BATCH_MAX_AGE_SECONDS", 5))
+POLL_SECONDS = float(os.getenv("BOT_EVENT_DATA_POLL_SECONDS", 30))
+RETRY_SECONDS = float(os.getenv("BOT_EVENT_DATA_RETRY_SECONDS", 30))
+NOTIFY_CHANNEL = "bot_event_inserted"
+
 # ------------------------------------------------------------------------------
 # Data Directory
 # ------------------------------------------------------------------------------
@@ -154,210 +212,795 @@ LAST_ID_ENDPOINT = os.getenv("BOT_EVENT_DATA_LAST_ID_ENDPOINT")
 # data_directory = "/usr/src/app/data"
 data_directory = f"{APP_PATH}/data"
 os.makedirs(data_directory, exist_ok=True)
-new_data_file_path = os.path.join(data_directory, "new_data.json")
+# Append-only NDJSON spool of the chunks that are posted but not yet acknowledged, replayed on the
+# next run after a crash or a failed POST. One compact line per event: {"id", "sender_id", "data"}.
+spool_file_path = os.path.join(data_directory, "export_spool.ndjson" + (".gz" if SPOOL_GZIP else ""))
+
+# Last acknowledged event id, kept locally so a run does not depend on the service's GET
+watermark_file_path = os.path.join(data_directory, "export_watermark.json")
+
+# Held while exporting, so an hourly cron run and the daemon never export the same events
+lock_file_path = os.path.join(data_directory, "export.lock")
+
 
 # ------------------------------------------------------------------------------
-# Database Connection
+# Local export watermark
 # ------------------------------------------------------------------------------
-try:
-    conn = psycopg2.connect(
-        host=db_host,
-        database=db_name,
-        user=db_user,
-        password=db_password,
-        port=db_port
-    )
-    cur = conn.cursor()
-    logging.info("Connected to the database successfully.")
-except Exception as e:
-    logging.error(f"Failed to connect to the database: {e}")
-    raise SystemExit(e)
+def read_watermark():
+    """{"last_event_id": int, "reconciled_at": epoch seconds}, or None before the first export."""
+    try:
+        with open(watermark_file_path, "r") as f:
+            watermark = json.load(f)
+        return {"last_event_id": int(watermark["last_event_id"]),
+                "reconciled_at": float(watermark.get("reconciled_at", 0))}
+    except FileNotFoundError:
+        return None
+    except (ValueError, KeyError, TypeError) as e:
+        logging.error(f"Unreadable watermark {watermark_file_path}: {e}")
+        return None
+
+
+def save_watermark(last_event_id, reconciled_at):
+    """Replace the watermark atomically: a crash leaves either the old or the new file, never a torn one."""
+    tmp_path = watermark_file_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"last_event_id": last_event_id, "reconciled_at": reconciled_at}, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, watermark_file_path)
+
+    dir_fd = os.open(data_directory, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)  # persist the rename itself
+    finally:
+        os.close(dir_fd)
+
+
+def resolve_start_id():
+    """
+    The id to export after, or None when it cannot be known safely.
+    The local watermark is used as is; the service's last id is only fetched when there is no
+    watermark yet or every RECONCILE_HOURS, and a failed GET never resets the export to id 0.
+    Returns (start_id, reconciled_at).
+    """
+    watermark = read_watermark()
+    now = time.time()
+
+    if watermark is not None and now - watermark["reconciled_at"] < RECONCILE_HOURS * 3600:
+        return watermark["last_event_id"], watermark["reconciled_at"]
+
+    remote_latest_id = get_remote_latest_id()
+
+    if watermark is None:
+        if remote_latest_id is None:
+            logging.error("No local watermark and the last event id is unavailable; not exporting.")
+            return None, 0
+        logging.info(f"No local watermark; starting after the service's last event id {remote_latest_id}.")
+        return remote_latest_id, now
+
+    local_id = watermark["last_event_id"]
+    if remote_latest_id is None:
+        logging.info(f"Reconciliation skipped (GET failed); continuing after local watermark {local_id}.")
+        return local_id, watermark["reconciled_at"]
+    if remote_latest_id != local_id:
+        # Resend rather than skip: chunks are uploaded in parallel, so the service's last id can be
+        # past a chunk it never acknowledged; and if it lost events, it gets them again.
+        start_id = min(local_id, remote_latest_id)
+        logging.warning(f"Watermark mismatch: local {local_id}, service {remote_latest_id}; "
+                        f"continuing after {start_id}.")
+        return start_id, now
+    logging.info(f"Watermark {local_id} matches the service.")
+    return local_id, now
+
+
+# ------------------------------------------------------------------------------
+# Crash-recovery spool
+# ------------------------------------------------------------------------------
+def spool_chunk(new_data):
+    """Append the chunk to the spool and fsync it before it is posted."""
+    lines = "".join(f'{{"id":{int(record_id)},{encode_event_fields(event)}}}\n'
+                    for record_id, event in new_data.items())
+    payload = lines.encode("utf-8")
+    if SPOOL_GZIP:
+        payload = gzip.compress(payload)  # one gzip member per chunk; members read back as one stream
+
+    with open(spool_file_path, "ab") as f:
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def clear_spool():
+    """Every spooled event is acknowledged."""
+    if os.path.exists(spool_file_path):
+        os.remove(spool_file_path)
+
+
+def read_spool(after_id):
+    """The spooled events with id > after_id, in id order, as a payload dict. Skips a torn last line."""
+    if not os.path.exists(spool_file_path):
+        return {}
+
+    events = {}
+    unreadable = None
+    try:
+        opener = gzip.open if SPOOL_GZIP else open
+        with opener(spool_file_path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if unreadable is not None:
+                    # Only the last line can be torn by a crash: this event is lost, say so
+                    logging.error(f"Skipping an unreadable line of {spool_file_path}: {unreadable}")
+                    unreadable = None
+                try:
+                    event = json.loads(line)
+                except json.JSONDecodeError:
+                    unreadable = line.rstrip("\n")
+                    continue
+                if event["id"] > after_id:
+                    events[event["id"]] = {"sender_id": event["sender_id"], "data": event["data"]}
+    except (EOFError, OSError) as e:
+        # A gzip member cut short by a crash; keep what was read before it
+        logging.info(f"Spool {spool_file_path} ends early: {e}")
+    if unreadable is not None:
+        logging.info(f"Skipping a torn line of {spool_file_path}")
+
+    return {str(record_id): events[record_id] for record_id in sorted(events)}
+
 
 # ------------------------------------------------------------------------------
 # 1) Retrieve the latest processed ID from the external API
 # ------------------------------------------------------------------------------
-try:
-    headers = {
-        'Content-Type': 'application/json',
-        'assistant-botid': 'exhibition-bot-kazantzakis'
-    }
-    response = requests.get(LAST_ID_ENDPOINT, headers=headers)
-    logging.info(f"Response from GET {LAST_ID_ENDPOINT}: {response.text}")
+def get_remote_latest_id():
+    """The service's last stored event id, or None when it could not be retrieved."""
+    try:
+        response = requests.get(LAST_ID_ENDPOINT, headers=HEADERS, timeout=HTTP_TIMEOUT)
+        logging.info(f"Response from GET {LAST_ID_ENDPOINT}: {response.text}")
+
+        if response.status_code == 200:
+            last_id_data = response.json()
+            remote_latest_id = last_id_data.get("last_event_id") if isinstance(last_id_data, dict) else None
+            if isinstance(remote_latest_id, bool) or not isinstance(remote_latest_id, int):
+                # Missing or null is not "nothing stored yet": reading it as 0 would resend the whole table
+                logging.info(f"No usable last_event_id in the response: {remote_latest_id!r}")
+                remote_latest_id = None
+            else:
+                logging.info(f"Retrieved latest processed ID from API: {remote_latest_id}")
+        else:
+            logging.info(f"Failed to retrieve last processed ID. "
+                         f"Status code: {response.status_code}, Response: {response.text}")
+            remote_latest_id = None
+    except (requests.RequestException, ValueError) as e:
+        logging.info(f"Error during GET {LAST_ID_ENDPOINT}: {e}")
+        remote_latest_id = None
+
+    return remote_latest_id
 
-    if response.status_code == 200:
-        last_id_data = response.json()
-        remote_latest_id = last_id_data.get("last_event_id", 0)
-        logging.info(f"Retrieved latest processed ID from API: {remote_latest_id}")
-    else:
-        logging.info(f"Failed to retrieve last processed ID. "
-                     f"Status code: {response.status_code}, Response: {response.text}")
-        remote_latest_id = 0
-except requests.RequestException as e:
-    logging.info(f"Error during GET {LAST_ID_ENDPOINT}: {e}")
-    remote_latest_id = 0
 
 # ------------------------------------------------------------------------------
-# 2) Query only new entries from the local DB (id > remote_latest_id)
+# 2) Stream the new entries from the local DB (id > last exported id) in chunks
 # ------------------------------------------------------------------------------
-query = "SELECT id, sender_id, data FROM events WHERE id > %s"
-cur.execute(query, (remote_latest_id,))
-rows = cur.fetchall()
-logging.info(f"Fetched {len(rows)} new rows (id > {remote_latest_id}).")
+# The newest committed id, and the transactions inserting into events at that moment. The snapshot is
+# taken when the statement starts, pg_locks is read after it: a writer missing from the list had
+# committed by then (and is seen by the export's later snapshot) or takes its ids after the newest one.
+SETTLE_QUERY = """
+SELECT (SELECT MAX(id) FROM events),
+       ARRAY(SELECT DISTINCT virtualtransaction FROM pg_locks
+             WHERE locktype = 'relation' AND relation = 'events'::regclass
+               AND mode = 'RowExclusiveLock' AND pid <> pg_backend_pid())
+"""
+WRITERS_QUERY = """
+SELECT DISTINCT virtualtransaction FROM pg_locks
+WHERE locktype = 'relation' AND relation = 'events'::regclass AND virtualtransaction = ANY(%s)
+"""
+
+
+def settled_event_id(conn, after_id):
+    """
+    The id up to which the events are settled: the newest committed id, once every transaction that was
+    inserting into events at that moment has ended. Ids are taken from the sequence before commit, so a
+    transaction can commit a lower id after a higher one is visible; exporting only up to this bound
+    keeps the watermark from passing such an id. Returns after_id (export nothing now) when the writers
+    are still running after SETTLE_TIMEOUT_SECONDS.
+    """
+    with conn.cursor() as cur:
+        cur.execute(SETTLE_QUERY)
+        max_id, writers = cur.fetchone()
+        deadline = time.monotonic() + SETTLE_TIMEOUT_SECONDS
+        while writers:
+            if time.monotonic() > deadline:
+                logging.warning(f"{len(writers)} transactions inserting into events are still running after "
+                                f"{SETTLE_TIMEOUT_SECONDS}s; not exporting past {after_id} for now.")
+                return after_id
+            time.sleep(0.05)
+            cur.execute(WRITERS_QUERY, (writers,))
+            writers = [row[0] for row in cur.fetchall()]
+    return max_id if max_id is not None else after_id
+
+
+def iter_event_chunks(conn, after_id, up_to_id, next_size):
+    """
+    Yield lists of (id, sender_id, data) rows with after_id < id <= up_to_id, in id order, next_size()
+    rows at a time. A named cursor keeps the result set on the PostgreSQL server; only one chunk is
+    fetched at a time.
+    """
+    query = "SELECT id, sender_id, data FROM events WHERE id > %s AND id <= %s ORDER BY id"
+    with conn.cursor(name="bot_event_export") as cur:
+        cur.execute(query, (after_id, up_to_id))
+        while True:
+            rows = cur.fetchmany(next_size())
+            if not rows:
+                break
+            yield rows
+
+
+class RawJSON(str):
+    """The stored JSON text of an event, embedded in the POST body as is."""
+
+
+def raw_event_data(data_str):
+    """
+    RawJSON for the stored text, or None when it is not a JSON object. VALIDATE=cheap only checks
+    the braces; text with a raw line break is re-encoded, since the spool holds one event per line.
+    """
+    text = data_str.strip() if data_str else ""
+    if VALIDATE == "full" or "\n" in text:
+        return RawJSON(encode_json(json.loads(text)))
+    if VALIDATE == "cheap" and not (text.startswith("{") and text.endswith("}")):
+        raise ValueError("not a JSON object")
+    return RawJSON(text)
+
+
+def drop_invalid_raw_events(new_data):
+    """
+    The events of the chunk whose RawJSON data parses. Used after a 400 in passthrough mode: the cheap
+    check lets malformed JSON through, and one such event makes the service reject the whole chunk.
+    """
+    valid = {}
+    for record_id, event in new_data.items():
+        if isinstance(event["data"], RawJSON):
+            try:
+                json.loads(event["data"])
+            except ValueError as e:
+                logging.error(f"Skipping event {record_id}: its stored data is not valid JSON ({e}): {event['data']}")
+                continue
+        valid[record_id] = event
+    return valid
+
+
+def build_payload(rows):
+    """Key the rows by their string record id, as the analytics service expects."""
+    new_data = {}
+    for record_id, sender_id, data_str in rows:
+        try:
+            parsed_data = raw_event_data(data_str) if PASSTHROUGH else json.loads(data_str)
+            new_data[str(record_id)] = {
+                "sender_id": sender_id,
+                "data": parsed_data
+            }
+        except (ValueError, TypeError):
+            logging.info(f"Error decoding JSON for id {record_id}: {data_str}")
+            continue
+    return new_data
+
+
+def encode_json(value):
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+def encode_event_fields(event):
+    """The "sender_id" and "data" members of an event; RawJSON data is copied in without a parse/serialize."""
+    data = event["data"]
+    data_json = data if isinstance(data, RawJSON) else encode_json(data)
+    return f'"sender_id":{encode_json(event["sender_id"])},"data":{data_json}'
+
+
+def encode_payload(new_data):
+    """
+    The POST body {"<record_id>": {"sender_id", "data"}, ...} as UTF-8 bytes, gzip-compressed
+    when GZIP_BODY is set. Returns (body, headers).
+    """
+    body = ("{" + ",".join(f'{encode_json(record_id)}:{{{encode_event_fields(event)}}}'
+                           for record_id, event in new_data.items()) + "}").encode("utf-8")
+    headers = dict(HEADERS)
+    if GZIP_BODY:
+        body = gzip.compress(body, compresslevel=5)
+        headers['Content-Encoding'] = 'gzip'
+    return body, headers
 
-# Prepare a dictionary to hold new data (keyed by string record_id)
-new_data = {}
-max_id = remote_latest_id
 
 # ------------------------------------------------------------------------------
-# Process each row
+# 3) Post one chunk
 # ------------------------------------------------------------------------------
-for row in rows:
-    record_id = row[0]  # integer ID
-    sender_id = row[1]
-    data_str = row[2]  # JSON string from DB
+_http = threading.local()
+
+
+def http_session():
+    """A keep-alive session per upload thread (requests sessions are not shared between threads)."""
+    session = getattr(_http, "session", None)
+    if session is None:
+        session = _http.session = requests.Session()
+    return session
+
+
+def post_new_data(data_for_post):
+    """
+    Posts the chunk's JSON data to POST_URL, sending assistant_botid in the header.
+    Returns (response, response_data): response is None when the service could not be reached.
+    """
+    logging.info(f"Posting new data to {POST_URL}")
 
     try:
-        parsed_data = json.loads(data_str)
-        new_data[str(record_id)] = {
-            "sender_id": sender_id,
-            "data": parsed_data
-        }
-        if record_id > max_id:
-            max_id = record_id
+        body, headers = encode_payload(data_for_post)
+        response = http_session().post(POST_URL, data=body, headers=headers, timeout=HTTP_TIMEOUT)
+        logging.info(f"response_post: {response}")
+    except requests.RequestException as e:
+        logging.info(f"Failed to reach {POST_URL}: {e}")
+        return None, None
+
+    if response.status_code != 200:
+        logging.info(f"Failed to post new data. Status code: {response.status_code}, "
+                     f"Response: {response.text}")
+        return response, None
+
+    logging.info("New data posted successfully.")
+    try:
+        response_data = response.json()
     except json.JSONDecodeError:
-        logging.info(f"Error decoding JSON for id {record_id}: {data_str}")
-        continue
+        logging.info(f"Failed to parse the POST response: {response.text}")
+        return response, None
+    logging.info(f"response_data: {response_data}")
+    return response, response_data
 
-# ------------------------------------------------------------------------------
-# If there's new data, store & post it
-# ------------------------------------------------------------------------------
-if new_data:
-    # Just save the raw dictionary (keys = record_ids)
+
+def post_missing_data(new_data, start_id, end_id):
+    """Re-post the events of the chunk with start_id < id <= end_id. Returns True on success."""
+    missing_data = {record_id: event for record_id, event in new_data.items()
+                    if start_id < int(record_id) <= end_id}
+    if not missing_data:
+        logging.info("No missing data found to post.")
+        return True
+
+    logging.info(f"Posting missing data for IDs between {start_id} and {end_id}...")
+    try:
+        body, headers = encode_payload(missing_data)
+        response = http_session().post(POST_URL, data=body, headers=headers, timeout=HTTP_TIMEOUT)
+        if response.status_code == 200:
+            logging.info("Missing data posted successfully.")
+            return True
+        logging.info(f"Failed to post missing data. Status code: {response.status_code}, "
+                     f"Response: {response.text}")
+    except requests.RequestException as e:
+        logging.info(f"Failed to reach {POST_URL} while posting missing data: {e}")
+    return False
+
+
+class AdaptiveChunkSize:
+    """
+    Events per chunk, adapted to how the service copes: grown by a quarter after a full chunk
+    acknowledged in under half of TARGET_LATENCY_SECONDS, shrunk by a quarter after one that took
+    longer than the target, halved on 429/5xx or when the service is unreachable.
+    Shared by the upload threads.
+    """
+
+    def __init__(self, size, minimum=CHUNK_MIN, maximum=CHUNK_MAX, target_seconds=TARGET_LATENCY_SECONDS):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.target_seconds = target_seconds
+        self.size = min(max(size, self.minimum), self.maximum)
+        self._lock = threading.Lock()
+
+    def _resize(self, size, reason):
+        size = min(max(int(size), self.minimum), self.maximum)
+        if size != self.size:
+            logging.info(f"Chunk size {self.size} -> {size} ({reason}).")
+            self.size = size
+
+    def on_acknowledged(self, events, seconds):
+        with self._lock:
+            if seconds > self.target_seconds:
+                self._resize(self.size * 0.75, f"POST took {seconds:.2f}s")
+            elif seconds < self.target_seconds / 2 and events >= self.size:
+                self._resize(self.size * 1.25, f"POST took {seconds:.2f}s")
+
+    def on_overloaded(self, reason):
+        with self._lock:
+            self._resize(self.size // 2, reason)
+
+
+def retry_delay(response, attempt):
+    """Seconds to wait before the next attempt: the service's Retry-After, else exponential backoff."""
+    if response is not None:
+        try:
+            return min(float(response.headers.get("Retry-After", "")), 60.0)
+        except ValueError:
+            pass
+    return min(2.0 ** attempt, 30.0)
+
+
+def export_chunk(new_data, max_id, chunk_size=None):
+    """
+    Post one chunk, retrying on 429/5xx or connection errors, and re-post the events the service
+    reports as failed. Latency and overload are reported to chunk_size (an AdaptiveChunkSize).
+    Returns True when the whole chunk is acknowledged.
+    """
     # Example final JSON structure:
     # {
     #   "14538": { ... },
     #   "14539": { ... }
     # }
-    with open(new_data_file_path, "w") as f:
-        json.dump(new_data, f, indent=4)
-    logging.info(f"New data saved to {new_data_file_path}")
+    if not new_data:
+        logging.info("No new data to post. The chunk is empty.")
+        return True
+
+    for attempt in range(1, UPLOAD_ATTEMPTS + 1):
+        started = time.monotonic()
+        response, response_data = post_new_data(new_data)
+        if response is not None and response.status_code == 200:
+            if chunk_size is not None:
+                chunk_size.on_acknowledged(len(new_data), time.monotonic() - started)
+            return check_results(new_data, max_id, response_data)
+
+        overloaded = response is None or response.status_code == 429 or response.status_code >= 500
+        if not overloaded:
+            if response.status_code == 400 and PASSTHROUGH:
+                valid = drop_invalid_raw_events(new_data)
+                if len(valid) < len(new_data):
+                    return export_chunk(valid, max_id, chunk_size)
+            return False
+        if chunk_size is not None:
+            chunk_size.on_overloaded("service unreachable" if response is None else f"HTTP {response.status_code}")
+        if attempt < UPLOAD_ATTEMPTS:
+            delay = retry_delay(response, attempt)
+            logging.info(f"Retrying chunk (..{max_id}) in {delay:.1f}s (attempt {attempt + 1}/{UPLOAD_ATTEMPTS}).")
+            time.sleep(delay)
+    return False
+
+
+def check_results(new_data, max_id, response_data):
+    """Check the per-event results of an answered POST; re-post the events after a reported error."""
+    if not response_data or "results" not in response_data:
+        logging.info("No 'results' field found in the POST response JSON.")
+        return True
+
+    error_detected = False
+    latest_bot_event_data_id = 0
+
+    for item in response_data["results"]:
+        status = item.get("status", "")
+        bot_event_data_id = item.get("bot_event_data_id", 0)
+        if bot_event_data_id > latest_bot_event_data_id:
+            latest_bot_event_data_id = bot_event_data_id
+
+        if status.lower() == "error":
+            error_detected = True
+            logging.info(f"Error for bot_event_data_id {bot_event_data_id}: "
+                         f"{item.get('message')}")
+
+    if not error_detected:
+        logging.info("No critical errors in POST results.")
+        return True
+
+    logging.info("One or more errors detected; checking for missing data...")
+    if latest_bot_event_data_id < max_id:
+        logging.info(f"Local max_id: {max_id}, response max_id with error: {latest_bot_event_data_id}")
+        return post_missing_data(new_data, latest_bot_event_data_id, max_id)
+
+    logging.info("No missing data to post despite the error.")
+    return True
 
 
-    def post_new_data(file_path):
-        """Reads and posts JSON data to POST_URL, sending assistant_botid in the header."""
+# ------------------------------------------------------------------------------
+# Main: upload the backlog in parallel chunks, checkpointing in id order
+# ------------------------------------------------------------------------------
+def iter_export_chunks(conn, after_id, up_to_id, chunk_size):
+    """
+    Yield (new_data, max_id, spooled) for every event with id > after_id, in id order: first the
+    events left in the spool by an earlier run (spooled True), then the rows of the database past them
+    up to up_to_id.
+    """
+    last_id = after_id
+
+    # Events of a run that crashed or failed before its chunks were acknowledged
+    spooled = read_spool(after_id)
+    if spooled:
+        spooled_ids = list(spooled)
+        logging.info(f"Replaying {len(spooled)} spooled events ({spooled_ids[0]}..{spooled_ids[-1]}).")
+        start = 0
+        while start < len(spooled_ids):
+            chunk_ids = spooled_ids[start:start + chunk_size.size]
+            start += len(chunk_ids)
+            yield {record_id: spooled[record_id] for record_id in chunk_ids}, int(chunk_ids[-1]), True
+        last_id = int(spooled_ids[-1])
+
+    for rows in iter_event_chunks(conn, last_id, up_to_id, lambda: chunk_size.size):
+        yield build_payload(rows), rows[-1][0], False
+
+
+def pop_acknowledged(in_flight):
+    """
+    Remove the finished chunks at the head of in_flight [(max_id, events, future)] up to the first
+    one that is still running or was not acknowledged.
+    Returns (last acknowledged max_id or None, acknowledged events, failed).
+    """
+    last_id, events = None, 0
+    while in_flight and in_flight[0][2].done():
+        max_id, count, future = in_flight[0]
         try:
-            with open(file_path, "r") as f:
-                data_for_post = json.load(f)
-        except Exception as e:
-            logging.info(f"Failed to load JSON from {file_path}: {e}")
-            return
-
-        if not data_for_post:
-            logging.info("No new data to post. The JSON file is empty.")
-            return
-
-        logging.info(f"Posting new data to {POST_URL}")
-        headers = {
-            'Content-Type': 'application/json',
-            'assistant-botid': 'exhibition-bot-kazantzakis'
-        }
-
+            acknowledged = future.result()
+        except Exception:
+            logging.exception(f"Upload of chunk (..{max_id}) failed")
+            acknowledged = False
+        if not acknowledged:
+            return last_id, events, True
+        in_flight.popleft()
+        last_id, events = max_id, events + count
+    return last_id, events, False
+
+
+def export_events(conn, after_id, chunk_size=CHUNK_SIZE, reconciled_at=0, concurrency=UPLOAD_CONCURRENCY):
+    """
+    Export every settled event (settled_event_id) with id > after_id, uploading up to `concurrency`
+    chunks at a time.
+    The checkpoint (the last acknowledged id) only advances over the contiguous prefix of
+    acknowledged chunks and is saved as the local watermark; after a chunk that is not
+    acknowledged no more chunks are started, so the next run resumes right after the prefix
+    (resending the chunks after it that were acknowledged out of order).
+    Returns (checkpoint, complete), complete being False when a chunk was not acknowledged.
+    """
+    checkpoint = after_id
+    exported = 0
+    failed = False
+    save_watermark(checkpoint, reconciled_at)
+
+    up_to_id = settled_event_id(conn, after_id)
+    sizes = AdaptiveChunkSize(chunk_size)
+    in_flight = deque()     # (max_id, events, future) in id order
+    spooled_chunks = 0      # chunks written to the spool since it was last cleared
+    # Finished chunks behind a slow one keep their slot, so the window stays bounded
+    window = concurrency * 4
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="upload") as pool:
+        chunks = iter_export_chunks(conn, after_id, up_to_id, sizes)
         try:
-            response = requests.post(POST_URL, json=data_for_post, headers=headers)
-            logging.info("response_post: ", response)
-        except requests.RequestException as e:
-            logging.info(f"Failed to reach {POST_URL}: {e}")
-            return
+            while not failed:
+                # Wait for a free upload slot; drain everything when the spool is due to be cleared
+                drain = spooled_chunks >= SPOOL_MAX_CHUNKS
+                while in_flight:
+                    running = [future for _, _, future in in_flight if not future.done()]
+                    if not drain and len(running) < concurrency and len(in_flight) < window:
+                        break
+                    if running:
+                        wait(running, return_when=FIRST_COMPLETED)
+                    last_id, events, failed = pop_acknowledged(in_flight)
+                    if last_id is not None:
+                        checkpoint = last_id
+                        exported += events
+                        save_watermark(checkpoint, reconciled_at)
+                        logging.info(f"Checkpoint advanced to {checkpoint}.")
+                    if failed:
+                        break
+                if failed:
+                    break
+                if drain:
+                    clear_spool()
+                    spooled_chunks = 0
+
+                chunk = next(chunks, None)
+                if chunk is None:
+                    break
+                new_data, max_id, spooled = chunk
+                if new_data and not spooled:
+                    spool_chunk(new_data)
+                    spooled_chunks += 1
+                in_flight.append((max_id, len(new_data), pool.submit(export_chunk, new_data, max_id, sizes)))
+        finally:
+            chunks.close()  # closes the server-side cursor before the transaction ends
+
+        # Let the uploads still running finish, then advance over what they acknowledged
+        wait([future for _, _, future in in_flight])
+        last_id, events, head_failed = pop_acknowledged(in_flight)
+        failed = failed or head_failed
+        if last_id is not None:
+            checkpoint = last_id
+            exported += events
+            save_watermark(checkpoint, reconciled_at)
+
+    if failed:
+        logging.info(f"Chunk (..{in_flight[0][0]}) not acknowledged; stopping at checkpoint {checkpoint}.")
+    else:
+        clear_spool()
 
-        if response.status_code == 200:
-            logging.info("New data posted successfully.")
-            try:
-                response_data = response.json()
-                logging.info("response_data: ", response_data)
-                if "results" in response_data:
-                    error_detected = False
-                    latest_bot_event_data_id = 0
-
-                    for item in response_data["results"]:
-                        status = item.get("status", "")
-                        bot_event_data_id = item.get("bot_event_data_id", 0)
-                        if bot_event_data_id > latest_bot_event_data_id:
-                            latest_bot_event_data_id = bot_event_data_id
-
-                        if status.lower() == "error":
-                            error_detected = True
-                            logging.info(f"Error for bot_event_data_id {bot_event_data_id}: "
-                                         f"{item.get('message')}")
-
-                    if error_detected:
-                        logging.info("One or more errors detected; checking for missing data...")
-                        if latest_bot_event_data_id < max_id:
-                            logging.info(
-                                f"Local max_id: {max_id}, response max_id with error: {latest_bot_event_data_id}")
-                            fetch_and_post_missing_data(latest_bot_event_data_id, max_id)
-                        else:
-                            logging.info("No missing data to post despite the error.")
-                    else:
-                        logging.info("No critical errors in POST results.")
-                else:
-                    logging.info("No 'results' field found in the POST response JSON.")
-            except json.JSONDecodeError:
-                logging.info(f"Failed to parse the POST response: {response.text}")
-        else:
-            logging.info(f"Failed to post new data. Status code: {response.status_code}, "
-                         f"Response: {response.text}")
-
-
-    def fetch_and_post_missing_data(start_id, end_id):
-        """Fetch missing data between start_id+1 and end_id, then re-post with assistant_botid as a header."""
-        query_missing = "SELECT id, sender_id, data FROM events WHERE id > %s AND id <= %s"
-        cur.execute(query_missing, (start_id, end_id))
-        rows_missing = cur.fetchall()
-        if not rows_missing:
-            logging.info("No missing data found to post.")
-            return
-
-        missing_data = {}
-        for row in rows_missing:
-            record_id = row[0]
-            sender_id = row[1]
-            data_str = row[2]
-            try:
-                parsed_data = json.loads(data_str)
-                missing_data[str(record_id)] = {
-                    "sender_id": sender_id,
-                    "data": parsed_data
-                }
-            except json.JSONDecodeError:
-                logging.info(f"Error decoding JSON for id {record_id}: {data_str}")
-                continue
+    if exported:
+        logging.info(f"Exported {exported} new events (id > {after_id}); checkpoint {checkpoint}.")
+    else:
+        logging.info("No new data to save or post.")
+    return checkpoint, not failed
 
-        headers = {
-            'Content-Type': 'application/json',
-            'assistant-botid': 'exhibition-bot-kazantzakis'
-        }
 
-        logging.info(f"Posting missing data for IDs between {start_id} and {end_id}...")
-        try:
-            response = requests.post(POST_URL, json=missing_data, headers=headers)
-            if response.status_code == 200:
-                logging.info("Missing data posted successfully.")
-            else:
-                logging.info(f"Failed to post missing data. Status code: {response.status_code}, "
-                             f"Response: {response.text}")
-        except requests.RequestException as e:
-            logging.info(f"Failed to reach {POST_URL} while posting missing data: {e}")
+def connect():
+    return psycopg2.connect(
+        host=db_host,
+        database=db_name,
+        user=db_user,
+        password=db_password,
+        port=db_port
+    )
 
 
-    # Finally, post the new data
-    post_new_data(new_data_file_path)
+def acquire_export_lock(wait):
+    """The open lock file, or None if another export holds the lock and wait is False."""
+    lock_file = open(lock_file_path, "w")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | (0 if wait else fcntl.LOCK_NB))
+    except BlockingIOError:
+        lock_file.close()
+        return None
+    return lock_file
+
+
+def export_once(conn):
+    """One export from the watermark on. Returns False when it stopped before the newest event."""
+    start_id, reconciled_at = resolve_start_id()
+    if start_id is None:
+        return False
+    try:
+        _, complete = export_events(conn, start_id, reconciled_at=reconciled_at)
+    finally:
+        conn.rollback()  # end the read transaction of the named cursor
+    return complete
 
-else:
-    logging.info("No new data to save or post.")
 
 # ------------------------------------------------------------------------------
-# Cleanup
+# Daemon mode: near-real-time export on LISTEN/NOTIFY
 # ------------------------------------------------------------------------------
-cur.close()
-conn.close()
-logging.info("Database connection closed.")
+NOTIFY_TRIGGER_SQL = f"""
+CREATE OR REPLACE FUNCTION notify_bot_event_inserted() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('{NOTIFY_CHANNEL}', NEW.id::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+# CREATE TRIGGER locks events against inserts, so it only runs when the trigger is missing
+NOTIFY_TRIGGER_EXISTS_SQL = """
+SELECT EXISTS (SELECT 1 FROM pg_trigger WHERE tgrelid = 'events'::regclass AND tgname = 'bot_event_inserted')
+"""
+NOTIFY_TRIGGER_CREATE_SQL = """
+CREATE TRIGGER bot_event_inserted AFTER INSERT ON events
+    FOR EACH ROW EXECUTE FUNCTION notify_bot_event_inserted();
+"""
+
+
+def install_notify_trigger(conn):
+    """
+    Create the insert trigger (one notification per row) unless it exists, so a daemon restart does
+    not lock events; without the trigger the daemon relies on polling alone.
+    """
+    try:
+        with conn.cursor() as cur:
+            cur.execute(NOTIFY_TRIGGER_EXISTS_SQL)
+            if not cur.fetchone()[0]:
+                cur.execute(NOTIFY_TRIGGER_SQL)
+                cur.execute(NOTIFY_TRIGGER_CREATE_SQL)
+                logging.info("Created the insert trigger bot_event_inserted on events.")
+        conn.commit()
+        logging.info(f"Insert trigger on events notifies channel {NOTIFY_CHANNEL}.")
+        return True
+    except psycopg2.Error as e:
+        conn.rollback()
+        logging.warning(f"Could not install the insert trigger ({e}); polling every {POLL_SECONDS}s only.")
+        return False
+
+
+def has_new_events(conn):
+    """Cheap primary-key probe for events past the watermark."""
+    watermark = read_watermark()
+    with conn.cursor() as cur:
+        cur.execute("SELECT EXISTS (SELECT 1 FROM events WHERE id > %s)",
+                    (watermark["last_event_id"] if watermark else 0,))
+        found = cur.fetchone()[0]
+    conn.rollback()
+    return found
+
+
+def run_daemon(stop):
+    """
+    Export continuously until stop() is true. Inserts are notified by the trigger; they are
+    collected into a micro-batch that is exported once BATCH_MAX_EVENTS inserts were notified or
+    the oldest is BATCH_MAX_AGE_SECONDS old. Every POLL_SECONDS the table is probed as well.
+    """
+    conn = connect()
+    listen_conn = connect()
+    listen_conn.autocommit = True
+    install_notify_trigger(conn)
+    with listen_conn.cursor() as cur:
+        cur.execute(f"LISTEN {NOTIFY_CHANNEL};")
+    logging.info("Exporter daemon started.")
+
+    pending = 0
+    first_pending_at = None
+    next_poll_at = time.monotonic()
+    retry_at = 0.0  # after a failed export, notifications wait until then as well
+
+    try:
+        while not stop():
+            now = time.monotonic()
+            if first_pending_at is not None and now >= retry_at:
+                timeout = max(0.0, first_pending_at + BATCH_MAX_AGE_SECONDS - now)
+            else:
+                timeout = max(0.0, next_poll_at - now)
+
+            if select.select([listen_conn], [], [], min(timeout, 1.0)) != ([], [], []):
+                listen_conn.poll()
+                if listen_conn.notifies:
+                    pending += len(listen_conn.notifies)
+                    listen_conn.notifies.clear()
+                    if first_pending_at is None:
+                        first_pending_at = time.monotonic()
+
+            now = time.monotonic()
+            batch_due = first_pending_at is not None and now >= retry_at and (
+                pending >= BATCH_MAX_EVENTS or now - first_pending_at >= BATCH_MAX_AGE_SECONDS)
+            poll_due = now >= next_poll_at
+            if not batch_due and not poll_due:
+                continue
+
+            next_poll_at = now + POLL_SECONDS
+            if batch_due or has_new_events(conn):
+                logging.info(f"Exporting micro-batch ({pending} new events notified).")
+                if not export_once(conn):
+                    # Not acknowledged (or the service is unreachable): retry later, not in a loop
+                    retry_at = next_poll_at = time.monotonic() + RETRY_SECONDS
+            pending = 0
+            first_pending_at = None
+    finally:
+        listen_conn.close()
+        conn.close()
+        logging.info("Exporter daemon stopped.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export new tracker store events to the analytics service.")
+    parser.add_argument("--daemon", action="store_true",
+                        help="keep running and export new events within seconds (LISTEN/NOTIFY + polling)")
+    args = parser.parse_args()
+
+    lock_file = acquire_export_lock(wait=args.daemon)
+    if lock_file is None:
+        logging.info("Another export (e.g. the daemon) is running; nothing to do.")
+        return
+
+    if args.daemon:
+        stopping = []
+        signal.signal(signal.SIGTERM, lambda signum, frame: stopping.append(signum))
+        signal.signal(signal.SIGINT, lambda signum, frame: stopping.append(signum))
+        while not stopping:
+            try:
+                run_daemon(stop=lambda: bool(stopping))
+            except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+                logging.error(f"Database connection lost: {e}; reconnecting in {RETRY_SECONDS}s.")
+                time.sleep(RETRY_SECONDS)
+        return
+
+    # --------------------------------------------------------------------------
+    # Database Connection
+    # --------------------------------------------------------------------------
+    try:
+        conn = connect()
+        logging.info("Connected to the database successfully.")
+    except Exception as e:
+        logging.error(f"Failed to connect to the database: {e}")
+        raise SystemExit(e)
+
+    try:
+        export_once(conn)
+    finally:
+        # ----------------------------------------------------------------------
+        # Cleanup
+        # ----------------------------------------------------------------------
+        conn.close()
+        logging.info("Database connection closed.")
+
+
+if __name__ == "__main__":
+    main()
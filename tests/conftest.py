@@ -0,0 +1,10 @@
+"""
+Importing actions.actions starts the metrics endpoint, loads the exhibit catalog from Neo4j and
+opens the fallback answer cache under actions/cache/; the tests need none of them.
+"""
+
+import os
+
+os.environ.setdefault("METRICS_ENABLED", "false")
+os.environ.setdefault("EXHIBIT_CATALOG_ENABLED", "false")
+os.environ.setdefault("FALLBACK_CACHE_ENABLED", "false")
@@ -0,0 +1,54 @@
+"""
+Regression check of the slot value resolution of the graph actions (actions.actions.parse_slot).
+
+An exact synonym or lookup-table match of any entity kind must win over a fuzzy match of a kind
+listed earlier: "πρώτο" is the first floor, not the collection 'Προσωπικά Αντικείμενα', and
+"Αυτόγραφα" is a collection, not the hall 'Βιογραφικά'.
+"""
+
+import asyncio
+
+import pytest
+
+from actions.actions import get_relationship_2_variables, parse_slot
+
+# get_relationship_1_variable (action_floor_exhibits, action_collection_exhibits)
+ONE_VARIABLE_KINDS = ('year', 'collection', 'floor')
+# get_relationship_2_variables (action_hall_exhibitions)
+HALL_KINDS = ('showcase', 'hall', 'collection')
+
+FIRST_FLOOR = ["1ος", "1οσ", "πρώτο", "πρώτος", "πρωτο", "πρωτος", "πρώτου", "πρωτου"]
+AUTOGRAPHS = ["Αυτόγραφα", "αυτόγραφα", "αυτογραφα"]
+PHOTO_ARCHIVE = ["Φωτογραφικό Αρχείο", "φωτογραφικο αρχειο", "φωτογραφικού αρχείου", "φωτογραφικου αρχειου",
+                 "φωτογραφικά αρχεία", "φωτογραφικα αρχεια", "φωτογραφικών αρχείων", "φωτογραφικό"]
+
+
+@pytest.mark.parametrize("value", FIRST_FLOOR)
+def test_first_floor_resolves_to_the_floor(value):
+    assert parse_slot(value, ONE_VARIABLE_KINDS) == ('floor', '1ος')
+
+
+@pytest.mark.parametrize("value", AUTOGRAPHS)
+def test_autographs_is_a_collection_not_a_hall(value):
+    assert parse_slot(value, HALL_KINDS) == ('collection', 'Αυτόγραφα')
+    assert parse_slot(value, ONE_VARIABLE_KINDS) == ('collection', 'Αυτόγραφα')
+
+
+@pytest.mark.parametrize("value", PHOTO_ARCHIVE)
+def test_photo_archive_is_a_collection_not_a_hall(value):
+    assert parse_slot(value, HALL_KINDS) == ('collection', 'Φωτογραφικό Αρχείο')
+
+
+@pytest.mark.parametrize("value, kinds, expected", [
+    ("1", HALL_KINDS, ('showcase', '1')),
+    ("12", HALL_KINDS, ('showcase', '12')),
+    ("1943", ONE_VARIABLE_KINDS, ('year', '1943')),
+    ("Ισόγειο", ONE_VARIABLE_KINDS, ('floor', 'Ισόγειο')),
+    ("Βιογραφικά", HALL_KINDS, ('hall', 'Βιογραφικά')),
+])
+def test_patterns_and_exact_names(value, kinds, expected):
+    assert parse_slot(value, kinds) == expected
+
+
+def test_unmatched_hall_finds_no_exhibits():
+    assert asyncio.run(get_relationship_2_variables(["xyzzy"], ["xyzzy"])) == ([], [])
@@ -0,0 +1,77 @@
+"""
+Near-duplicate matching of the GenAI fallback answer cache (actions.fallback_cache).
+
+A near match may only serve a rewording of the same question: a question that differs in one word
+is another question, however similar its trigrams are.
+"""
+
+import sqlite3
+
+import pytest
+
+from actions.fallback_cache import FallbackCache
+
+VERSION = "v1"
+
+
+@pytest.fixture
+def cache():
+    cache = FallbackCache(":memory:")
+    yield cache
+    cache.close()
+
+
+def test_exact_match_ignores_case_accents_and_punctuation(cache):
+    cache.put("Ποιες ώρες είναι ανοιχτό το μουσείο;", VERSION, ["09:00-17:00"])
+    cached = cache.get("ποιες ωρες ειναι ανοιχτο το μουσειο", VERSION)
+    assert cached.messages == ("09:00-17:00",) and cached.score == 1.0
+
+
+def test_reordered_question_is_a_near_match(cache):
+    cache.put("Ποιες ώρες είναι ανοιχτό το μουσείο;", VERSION, ["09:00-17:00"])
+    cached = cache.get("Το μουσείο ποιες ώρες είναι ανοιχτό;", VERSION)
+    assert cached.messages == ("09:00-17:00",) and cached.score < 1.0
+
+
+@pytest.mark.parametrize("stored, asked", [
+    ("Is the museum open on Monday?", "Is the museum open on Sunday?"),
+    ("Ποιες ώρες είναι ανοιχτό το μουσείο τη Δευτέρα;", "Ποιες ώρες είναι ανοιχτό το μουσείο την Τρίτη;"),
+])
+def test_one_different_word_is_a_miss(cache, stored, asked):
+    cache.put(stored, VERSION, ["answer"])
+    assert cache.get(asked, VERSION) is None
+
+
+@pytest.mark.parametrize("stored, asked", [
+    ("Τι ώρα ανοίγει το μουσείο;", "Πότε ανοίγει το μουσείο;"),
+    ("Πόσο κοστίζει το εισιτήριο του μουσείου;", "Πόσο κάνει το εισιτήριο για το μουσείο;"),
+])
+def test_paraphrase_is_a_miss(cache, stored, asked):
+    cache.put(stored, VERSION, ["answer"])
+    assert cache.get(asked, VERSION) is None
+
+
+def test_retain_version_drops_the_answers_of_other_prompts(cache):
+    cache.put("Πόσο κοστίζει το εισιτήριο;", "old", ["4 ευρώ"])
+    cache.put("Πόσο κοστίζει το εισιτήριο;", VERSION, ["5 ευρώ"])
+    assert cache.retain_version(VERSION) == 1
+    assert cache.get("Πόσο κοστίζει το εισιτήριο;", "old") is None
+    assert cache.get("Πόσο κοστίζει το εισιτήριο;", VERSION).messages == ("5 ευρώ",)
+
+
+def test_locked_file_is_a_miss_not_an_error(tmp_path):
+    path = str(tmp_path / "answers.sqlite3")
+    cache = FallbackCache(path)
+    cache.put("Πόσο κοστίζει το εισιτήριο;", "old", ["4 ευρώ"])
+    cache._db.execute("PRAGMA busy_timeout = 0")
+    other = sqlite3.connect(path, isolation_level=None)
+    other.execute("BEGIN EXCLUSIVE")
+    try:
+        assert cache.retain_version(VERSION) == 0
+        assert cache.get("Πόσο κοστίζει το εισιτήριο;", VERSION) is None
+        cache.put("Πόσο κοστίζει το εισιτήριο;", VERSION, ["5 ευρώ"])
+    finally:
+        other.rollback()
+        other.close()
+    assert cache.retain_version(VERSION) == 1  # tried again once the file is free
+    cache.close()
@@ -0,0 +1,183 @@
+"""
+Watermark, checkpoint, spool and passthrough logic of the event export
+(scripts/store-bot-event-data/main.py).
+"""
+
+import importlib.util
+import json
+import logging
+import os
+import tempfile
+from collections import deque
+from concurrent.futures import Future
+from pathlib import Path
+
+import pytest
+
+SCRIPT_PATH = Path(__file__).resolve().parent.parent / "scripts" / "store-bot-event-data" / "main.py"
+
+# The script creates its logs/ and data/ directories under APP_PATH when it is imported
+os.environ.setdefault("APP_PATH", tempfile.mkdtemp(prefix="store-bot-event-data-"))
+_spec = importlib.util.spec_from_file_location("store_bot_event_data", SCRIPT_PATH)
+exporter = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(exporter)
+
+
+class FakeResponse:
+
+    def __init__(self, status_code=200, payload=None):
+        self.status_code = status_code
+        self._payload = payload
+        self.text = repr(payload)
+        self.headers = {}
+
+    def json(self):
+        return self._payload
+
+
+@pytest.fixture(autouse=True)
+def data_directory(tmp_path, monkeypatch):
+    monkeypatch.setattr(exporter, "data_directory", str(tmp_path))
+    monkeypatch.setattr(exporter, "watermark_file_path", str(tmp_path / "export_watermark.json"))
+    monkeypatch.setattr(exporter, "spool_file_path", str(tmp_path / "export_spool.ndjson"))
+    return tmp_path
+
+
+def answer_last_id(monkeypatch, response):
+    monkeypatch.setattr(exporter.requests, "get", lambda *args, **kwargs: response)
+
+
+@pytest.mark.parametrize("payload", [{"last_event_id": None}, {}, {"last_event_id": "12"}, []])
+def test_unusable_last_event_id_keeps_the_watermark(monkeypatch, payload):
+    exporter.save_watermark(500, reconciled_at=0)
+    answer_last_id(monkeypatch, FakeResponse(200, payload))
+    assert exporter.resolve_start_id() == (500, 0)
+
+
+def test_unusable_last_event_id_without_a_watermark_exports_nothing(monkeypatch):
+    answer_last_id(monkeypatch, FakeResponse(200, {"last_event_id": None}))
+    assert exporter.resolve_start_id() == (None, 0)
+
+
+def test_watermark_mismatch_resends_from_the_lower_id(monkeypatch):
+    exporter.save_watermark(500, reconciled_at=0)
+    answer_last_id(monkeypatch, FakeResponse(200, {"last_event_id": 450}))
+    start_id, reconciled_at = exporter.resolve_start_id()
+    assert start_id == 450 and reconciled_at > 0
+
+
+def test_recent_watermark_is_used_without_a_request(monkeypatch):
+    exporter.save_watermark(500, reconciled_at=1e12)
+    answer_last_id(monkeypatch, None)  # would fail resolve_start_id if it were called
+    assert exporter.resolve_start_id() == (500, 1e12)
+
+
+def test_watermark_round_trip():
+    assert exporter.read_watermark() is None
+    exporter.save_watermark(123, reconciled_at=45.0)
+    assert exporter.read_watermark() == {"last_event_id": 123, "reconciled_at": 45.0}
+
+
+def test_unreadable_watermark_is_no_watermark(data_directory):
+    (data_directory / "export_watermark.json").write_text("{\"last_event_")
+    assert exporter.read_watermark() is None
+
+
+# ------------------------------------------------------------------------------
+# Checkpoint over the contiguous prefix of acknowledged chunks
+# ------------------------------------------------------------------------------
+def finished(acknowledged):
+    future = Future()
+    future.set_result(acknowledged)
+    return future
+
+
+def test_checkpoint_stops_at_a_running_chunk():
+    in_flight = deque([(100, 10, finished(True)), (200, 10, Future()), (300, 10, finished(True))])
+    assert exporter.pop_acknowledged(in_flight) == (100, 10, False)
+    assert [max_id for max_id, _, _ in in_flight] == [200, 300]
+
+
+def test_checkpoint_stops_at_a_chunk_that_was_not_acknowledged():
+    in_flight = deque([(100, 10, finished(True)), (200, 10, finished(False)), (300, 10, finished(True))])
+    assert exporter.pop_acknowledged(in_flight) == (100, 10, True)
+
+
+def test_failed_upload_is_not_acknowledged():
+    failed = Future()
+    failed.set_exception(RuntimeError("boom"))
+    assert exporter.pop_acknowledged(deque([(100, 10, failed)])) == (None, 0, True)
+
+
+# ------------------------------------------------------------------------------
+# Crash-recovery spool
+# ------------------------------------------------------------------------------
+def events(*record_ids):
+    return {str(record_id): {"sender_id": "s1", "data": {"event": "user", "text": f"μήνυμα {record_id}"}}
+            for record_id in record_ids}
+
+
+def test_spool_replays_the_events_after_the_checkpoint_in_id_order():
+    exporter.spool_chunk(events(4, 5, 6))
+    exporter.spool_chunk(events(1, 2, 3))
+    assert exporter.read_spool(after_id=2) == events(3, 4, 5, 6)
+    exporter.clear_spool()
+    assert exporter.read_spool(after_id=0) == {}
+
+
+def test_spool_skips_a_torn_last_line(data_directory):
+    exporter.spool_chunk(events(1, 2))
+    with open(data_directory / "export_spool.ndjson", "a", encoding="utf-8") as f:
+        f.write('{"id":3,"sender_id":"s1","da')
+    assert exporter.read_spool(after_id=0) == events(1, 2)
+
+
+def test_spool_reports_an_unreadable_line_before_the_end(data_directory, caplog):
+    exporter.spool_chunk(events(1))
+    with open(data_directory / "export_spool.ndjson", "a", encoding="utf-8") as f:
+        f.write('{"id":2,"sender_id":"s1","data":{bad}}\n')
+    exporter.spool_chunk(events(3))
+    with caplog.at_level(logging.ERROR):
+        assert exporter.read_spool(after_id=0) == events(1, 3)
+    assert "unreadable line" in caplog.text
+
+
+# ------------------------------------------------------------------------------
+# Passthrough encoding
+# ------------------------------------------------------------------------------
+def raw_rows():
+    return [(1, "s1", '{"event": "user", "text": "ok"}'),
+            (2, "s1", '{"event": "user", "text": }'),  # passes the cheap brace check
+            (3, "s1", '{"event": "bot", "text": "ok"}')]
+
+
+def test_rejected_passthrough_chunk_is_posted_again_without_its_invalid_events(monkeypatch, caplog):
+    monkeypatch.setattr(exporter, "PASSTHROUGH", True)
+    monkeypatch.setattr(exporter, "VALIDATE", "cheap")
+    posted = []
+
+    def post_new_data(data_for_post):
+        body, _ = exporter.encode_payload(data_for_post)
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            return FakeResponse(400, {"detail": "invalid JSON"}), None
+        posted.append(sorted(payload))
+        return FakeResponse(200), {"results": [{"bot_event_data_id": int(record_id), "status": "success"}
+                                               for record_id in payload]}
+
+    monkeypatch.setattr(exporter, "post_new_data", post_new_data)
+    new_data = exporter.build_payload(raw_rows())
+    assert sorted(new_data) == ["1", "2", "3"]
+
+    with caplog.at_level(logging.ERROR):
+        assert exporter.export_chunk(new_data, max_id=3) is True
+    assert posted == [["1", "3"]]
+    assert "Skipping event 2" in caplog.text
+
+
+def test_rejected_chunk_without_invalid_events_is_not_acknowledged(monkeypatch):
+    monkeypatch.setattr(exporter, "PASSTHROUGH", True)
+    monkeypatch.setattr(exporter, "post_new_data", lambda data_for_post: (FakeResponse(400), None))
+    new_data = exporter.build_payload(raw_rows()[:1])
+    assert exporter.export_chunk(new_data, max_id=1) is False